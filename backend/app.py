@@ -3,13 +3,21 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import json
+import hashlib
 import logging
 from datetime import datetime
 import traceback
+from typing import Optional
+import queue
+import threading
+import time
+import uuid
+from collections import deque
 
 # Intentar importar ambos motores de búsqueda
 try:
     from elasticsearch import Elasticsearch
+    from elasticsearch.helpers import parallel_bulk
     ELASTICSEARCH_AVAILABLE = True
 except ImportError:
     ELASTICSEARCH_AVAILABLE = False
@@ -20,6 +28,27 @@ try:
 except ImportError:
     SQLITE_AVAILABLE = False
 
+# Parser JSON en C (opcional) para cargas grandes y respuestas
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Structs con esquema fijo (opcional) para los resultados de búsqueda
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# Parser JSON incremental (opcional) para no cargar todo el archivo en memoria
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
 app = Flask(__name__)
 CORS(app)
 
@@ -30,10 +59,126 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+if MSGSPEC_AVAILABLE:
+    class PatentHit(msgspec.Struct):
+        """Resultado de búsqueda con esquema fijo (sin dict por hit)"""
+        id: Optional[str] = None
+        title: Optional[str] = None
+        abstract: Optional[str] = None
+        description: Optional[str] = None
+        claims: Optional[str] = None
+        assignee: Optional[str] = None
+        inventors: Optional[list] = None
+        application_date: Optional[str] = None
+        publication_date: Optional[str] = None
+        ipc_class: Optional[str] = None
+        ipc_classes: Optional[list] = None
+        category: Optional[str] = None
+        score: float = 0.0
+        highlights: dict = {}
+    
+    JSON_ENCODER = msgspec.json.Encoder()
+
+# (segundo epoch, marca ISO) de la última respuesta
+_timestamp_cache = (0, "")
+
+def current_timestamp():
+    """Marca de tiempo ISO con resolución de segundos, formateada una vez por segundo"""
+    global _timestamp_cache
+    now = int(time.time())
+    second, formatted = _timestamp_cache
+    
+    if now != second:
+        formatted = datetime.fromtimestamp(now).isoformat()
+        _timestamp_cache = (now, formatted)
+    
+    return formatted
+
+def read_patents_file(patents_file):
+    """Leer archivo JSON de patentes (orjson si está disponible)"""
+    if ORJSON_AVAILABLE:
+        with open(patents_file, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    with open(patents_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def iter_patents_file(patents_file):
+    """Iterar patentes del archivo JSON una a una (ijson si está disponible)"""
+    if IJSON_AVAILABLE:
+        with open(patents_file, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+    else:
+        yield from read_patents_file(patents_file)
+
+def json_response(payload, status=200, non_str_keys=False):
+    """Serializar respuesta JSON (msgspec u orjson si están disponibles)
+    
+    non_str_keys: el payload puede tener claves no str (p. ej. categoría nula en
+    agregaciones), que msgspec no acepta: se codifica directamente con orjson.
+    """
+    if MSGSPEC_AVAILABLE and not non_str_keys:
+        return app.response_class(
+            JSON_ENCODER.encode(payload),
+            status=status,
+            mimetype='application/json'
+        )
+    
+    if ORJSON_AVAILABLE:
+        return app.response_class(
+            orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS),
+            status=status,
+            mimetype='application/json'
+        )
+    
+    response = jsonify(payload)
+    response.status_code = status
+    return response
+
 class PatentSearchAPI:
+    # Segundos durante los que se reutilizan las agregaciones calculadas
+    AGGREGATIONS_TTL = 60
+    
+    # Cliente Elasticsearch: pool de conexiones persistentes (keep-alive)
+    ELASTICSEARCH_HOSTS = [{'host': 'localhost', 'port': 9200}]
+    ELASTICSEARCH_OPTIONS = {
+        'maxsize': 25,
+        'http_compress': True,
+        'timeout': 30,
+        'retry_on_timeout': True,
+        'max_retries': 3
+    }
+    
+    # Campos de la respuesta de búsqueda que usa la API
+    ELASTICSEARCH_SEARCH_FILTER = [
+        "hits.total.value",
+        "hits.hits._source",
+        "hits.hits._score",
+        "hits.hits.highlight"
+    ]
+    
+    # Campos de _source que devuelve la búsqueda (los de PatentHit, sin score ni highlights)
+    ELASTICSEARCH_SOURCE_FIELDS = [
+        "id", "title", "abstract", "description", "claims", "assignee", "inventors",
+        "application_date", "publication_date", "ipc_class", "ipc_classes", "category"
+    ]
+    
+    # Rutas donde buscar el archivo de patentes si no se indica uno
+    PATENTS_FILE_CANDIDATES = [
+        "../data/processed/patents.json",
+        "data/processed/patents.json",
+        "patents.json"
+    ]
+    
     def __init__(self):
         self.search_engine = None
         self.engine_type = None
+        self._patents_path = None
+        self._aggregations_cache = {}
+        self._cache_generation = 0
+        # Identifica el contenido indexado; cambia en cada carga (ETags de búsqueda)
+        self.corpus_version = uuid.uuid4().hex
+        self._cache_lock = threading.Lock()
         self.setup_search_engine()
     
     def setup_search_engine(self):
@@ -42,7 +187,7 @@ class PatentSearchAPI:
         # Intentar Elasticsearch primera
         if ELASTICSEARCH_AVAILABLE:
             try:
-                es_client = Elasticsearch([{'host': 'localhost', 'port': 9200}])
+                es_client = Elasticsearch(self.ELASTICSEARCH_HOSTS, **self.ELASTICSEARCH_OPTIONS)
                 if es_client.ping():
                     self.search_engine = es_client
                     self.engine_type = "elasticsearch"
@@ -99,6 +244,7 @@ class PatentSearchAPI:
                     "abstract": {}
                 }
             },
+            "_source": self.ELASTICSEARCH_SOURCE_FIELDS,
             "size": limit
         }
         
@@ -115,21 +261,55 @@ class PatentSearchAPI:
             
             search_body["query"] = {"bool": bool_query}
         
-        response = self.search_engine.search(index="patents", body=search_body)
-        
-        results = []
-        for hit in response["hits"]["hits"]:
-            result = hit["_source"]
-            result["score"] = hit["_score"]
-            result["highlights"] = hit.get("highlight", {})
-            results.append(result)
+        # filter_path: Elasticsearch devuelve solo los campos que usa la API
+        response = self.search_engine.search(
+            index="patents",
+            body=search_body,
+            filter_path=self.ELASTICSEARCH_SEARCH_FILTER
+        )
+        hits = response.get("hits", {})
+        
+        if MSGSPEC_AVAILABLE:
+            # Struct construido directamente desde _source (limitado a sus campos), sin dict intermedio
+            results = [
+                PatentHit(**hit["_source"], score=hit["_score"], highlights=hit.get("highlight", {}))
+                for hit in hits.get("hits", [])
+            ]
+        else:
+            results = [
+                {**hit["_source"], "score": hit["_score"], "highlights": hit.get("highlight", {})}
+                for hit in hits.get("hits", [])
+            ]
         
         return {
-            "total": response["hits"]["total"]["value"],
+            "total": hits.get("total", {}).get("value", 0),
             "results": results,
             "engine": "elasticsearch"
         }
     
+    def search_by_field_elasticsearch(self, field, value, limit):
+        """Búsqueda por campo en Elasticsearch (solo filtro, sin scoring)"""
+        if field in ("category", "ipc_class"):
+            field_filter = {"term": {field: value}}
+        elif field in ("assignee", "inventors"):
+            # Frase con prefijo en el último término sobre el campo analizado, como la
+            # búsqueda por campo de SQLite (sin comodines iniciales ni mayúsculas)
+            field_filter = {"match_phrase_prefix": {field: value}}
+        else:
+            raise ValueError("Invalid field. Must be one of: ['assignee', 'category', 'ipc_class', 'inventors']")
+        
+        search_body = {
+            "size": limit,
+            "query": {"bool": {"filter": [field_filter]}}
+        }
+        
+        response = self.search_engine.search(
+            index="patents",
+            body=search_body,
+            filter_path=["hits.hits._source"]
+        )
+        return [hit["_source"] for hit in response.get("hits", {}).get("hits", [])]
+    
     def search_sqlite(self, query, limit, filters):
         """Búsqueda usando SQLite (Thread-Safe)"""
         try:
@@ -154,10 +334,40 @@ class PatentSearchAPI:
             raise e
     
     def get_aggregations(self):
-        """Obtener agregaciones/estadísticas"""
+        """Obtener agregaciones/estadísticas (cacheadas AGGREGATIONS_TTL segundos)"""
         if not self.search_engine:
             return {}
         
+        with self._cache_lock:
+            generation = self._cache_generation
+            cached = self._aggregations_cache.get(self.engine_type)
+            if cached and time.monotonic() - cached[0] < self.AGGREGATIONS_TTL:
+                return cached[1]
+        
+        aggregations = self.compute_aggregations()
+        
+        # No guardar si hubo error o si una carga invalidó la caché mientras tanto
+        if aggregations:
+            with self._cache_lock:
+                if generation == self._cache_generation:
+                    self._aggregations_cache[self.engine_type] = (time.monotonic(), aggregations)
+        
+        return aggregations
+    
+    def invalidate_cache(self):
+        """Descartar agregaciones cacheadas (tras cargar datos)"""
+        with self._cache_lock:
+            self._cache_generation += 1
+            self._aggregations_cache.clear()
+            self.corpus_version = uuid.uuid4().hex
+    
+    def search_etag(self, query, limit, filters):
+        """ETag de una búsqueda: versión del corpus + parámetros normalizados"""
+        key = f"{self.engine_type}:{self.corpus_version}:{query}:{limit}:{sorted(filters.items())}"
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    
+    def compute_aggregations(self):
+        """Calcular agregaciones en el motor de búsqueda"""
         try:
             if self.engine_type == "elasticsearch":
                 # Elasticsearch aggregations
@@ -181,25 +391,39 @@ class PatentSearchAPI:
             logger.error(traceback.format_exc())
             return {}
     
+    def resolve_patents_file(self, patents_file=None):
+        """Resolver la ruta del archivo de patentes (None si no existe)"""
+        if patents_file:
+            candidates = [patents_file]
+        elif self._patents_path:
+            # Ruta ya descubierta en una carga anterior
+            candidates = [self._patents_path] + self.PATENTS_FILE_CANDIDATES
+        else:
+            candidates = self.PATENTS_FILE_CANDIDATES
+        
+        for path in candidates:
+            try:
+                os.stat(path)
+            except OSError:
+                continue
+            
+            if not patents_file:
+                self._patents_path = path
+            return path
+        
+        return None
+    
     def load_data(self, patents_file=None):
         """Cargar datos en el motor de búsqueda"""
-        if not patents_file:
-            # Buscar archivo de patentes
-            possible_paths = [
-                "../data/processed/patents.json",
-                "data/processed/patents.json",
-                "patents.json"
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path):
-                    patents_file = path
-                    break
+        resolved_file = self.resolve_patents_file(patents_file)
         
-        if not patents_file or not os.path.exists(patents_file):
-            logger.error(f"Patents data file not found. Tried: {possible_paths}")
+        if not resolved_file:
+            tried = [patents_file] if patents_file else self.PATENTS_FILE_CANDIDATES
+            logger.error(f"Patents data file not found. Tried: {tried}")
             return {"error": "Patents data file not found", "success": False}
         
+        patents_file = resolved_file
+        
         try:
             logger.info(f"Loading patents from: {patents_file}")
             
@@ -212,11 +436,12 @@ class PatentSearchAPI:
             logger.error(f"Data loading error: {e}")
             logger.error(traceback.format_exc())
             return {"error": str(e), "success": False}
+        finally:
+            self.invalidate_cache()
     
     def load_data_elasticsearch(self, patents_file):
         """Cargar datos en Elasticsearch"""
-        with open(patents_file, 'r', encoding='utf-8') as f:
-            patents = json.load(f)
+        patents = iter_patents_file(patents_file)
         
         # Crear índice con mapping
         mapping = {
@@ -238,38 +463,94 @@ class PatentSearchAPI:
             }
         }
         
-        # Recrear índice
-        if self.search_engine.indices.exists(index="patents"):
-            self.search_engine.indices.delete(index="patents")
+        # Cargar en un índice nuevo y versionado: el alias "patents" sigue apuntando a los
+        # datos anteriores hasta que la carga termina (un JSON truncado no borra nada)
+        new_index = f"patents-{datetime.now():%Y%m%d%H%M%S%f}"
+        self.search_engine.indices.create(index=new_index, body=mapping)
+        
+        # Valores con que quedó creado el índice (plantillas o defaults del cluster);
+        # None restablece el default si el índice no los define
+        index_settings = self.search_engine.indices.get_settings(index=new_index)
+        index_settings = index_settings[new_index]["settings"]["index"]
+        original_settings = {
+            "refresh_interval": index_settings.get("refresh_interval"),
+            "number_of_replicas": index_settings.get("number_of_replicas")
+        }
         
-        self.search_engine.indices.create(index="patents", body=mapping)
+        # Desactivar refresh y réplicas durante la carga masiva
+        self.search_engine.indices.put_settings(
+            index=new_index,
+            body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+        )
+        
+        def actions():
+            for i, patent in enumerate(patents):
+                yield {
+                    "_op_type": "index",
+                    "_index": new_index,
+                    "_id": patent.get("id", f"patent_{i}"),
+                    "_source": patent
+                }
         
-        # Indexar documentos
-        for i, patent in enumerate(patents):
-            self.search_engine.index(
-                index="patents",
-                id=patent.get("id", f"patent_{i}"),
-                body=patent
+        # Indexar documentos en lotes paralelos
+        indexed = 0
+        try:
+            for ok, info in parallel_bulk(
+                self.search_engine, actions(),
+                thread_count=4, chunk_size=1000, queue_size=4,
+                raise_on_error=False
+            ):
+                if ok:
+                    indexed += 1
+                    if indexed % 10000 == 0:
+                        logger.info(f"Indexed {indexed} patents...")
+                else:
+                    logger.warning(f"Bulk indexing error: {info}")
+            
+            self.search_engine.indices.put_settings(
+                index=new_index,
+                body={"index": original_settings}
             )
+            self.search_engine.indices.refresh(index=new_index)
+        except Exception:
+            # Archivo inválido o error de Elasticsearch: descartar la carga parcial
+            self.search_engine.indices.delete(index=new_index, ignore_unavailable=True)
+            raise
+        
+        self.swap_patents_alias(new_index)
+        
+        return {"success": True, "indexed": indexed}
+    
+    def swap_patents_alias(self, new_index):
+        """Apuntar el alias "patents" al índice nuevo en una sola operación y borrar los anteriores"""
+        old_indices = []
+        if self.search_engine.indices.exists_alias(name="patents"):
+            old_indices = list(self.search_engine.indices.get_alias(name="patents"))
+        
+        alias_actions = [{"remove": {"index": index, "alias": "patents"}} for index in old_indices]
+        
+        # Bases anteriores: "patents" era un índice, no un alias
+        if not old_indices and self.search_engine.indices.exists(index="patents"):
+            alias_actions.append({"remove_index": {"index": "patents"}})
+        
+        alias_actions.append({"add": {"index": new_index, "alias": "patents"}})
+        self.search_engine.indices.update_aliases(body={"actions": alias_actions})
         
-        return {"success": True, "indexed": len(patents)}
+        if old_indices:
+            self.search_engine.indices.delete(index=",".join(old_indices))
     
     def load_data_sqlite(self, patents_file):
         """Cargar datos en SQLite (Thread-Safe)"""
         try:
-            # Verificar que el archivo existe y es válido
-            with open(patents_file, 'r', encoding='utf-8') as f:
-                patents = json.load(f)
+            # Indexar en streaming usando el método thread-safe
+            indexed = self.search_engine.index_patents(iter_patents_file(patents_file))
             
-            logger.info(f"Found {len(patents)} patents in file")
-            
-            # Indexar usando el método thread-safe
-            self.search_engine.index_patents(patents)
+            logger.info(f"Indexed {indexed} patents from file")
             
             return {
                 "success": True, 
-                "message": f"Data loaded into SQLite ({len(patents)} patents)",
-                "indexed": len(patents)
+                "message": f"Data loaded into SQLite ({indexed} patents)",
+                "indexed": indexed
             }
             
         except Exception as e:
@@ -277,8 +558,83 @@ class PatentSearchAPI:
             logger.error(traceback.format_exc())
             raise e
 
+class IndexJobQueue:
+    """Cola de trabajos de indexación en segundo plano para /api/setup"""
+    
+    # Trabajos terminados cuyo estado se conserva (los más recientes)
+    MAX_FINISHED_JOBS = 100
+    
+    def __init__(self, api, maxsize=10):
+        self.api = api
+        self.jobs = {}
+        self.finished_jobs = deque()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=maxsize)
+        
+        # Un solo worker: cada carga reemplaza el índice completo
+        self.worker = threading.Thread(target=self._worker, name="index-worker", daemon=True)
+        self.worker.start()
+    
+    def submit(self, patents_file=None):
+        """Encolar un trabajo de carga y devolver su estado inicial"""
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "file_path": patents_file,
+            "submitted_at": datetime.now().isoformat()
+        }
+        
+        with self.lock:
+            self.jobs[job_id] = job
+        
+        try:
+            self.queue.put_nowait((job_id, patents_file))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            raise
+        
+        return dict(job)
+    
+    def get_status(self, job_id):
+        """Obtener estado de un trabajo (None si no existe)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+    
+    def _worker(self):
+        while True:
+            job_id, patents_file = self.queue.get()
+            self._update(job_id, status="running", started_at=datetime.now().isoformat())
+            
+            try:
+                result = self.api.load_data(patents_file)
+                status = "completed" if result.get("success") else "failed"
+                self._update(job_id, status=status, result=result)
+            except Exception as e:
+                logger.error(f"Index job {job_id} error: {e}")
+                logger.error(traceback.format_exc())
+                self._update(job_id, status="failed", result={"error": str(e), "success": False})
+            finally:
+                self._update(job_id, finished_at=datetime.now().isoformat())
+                self._expire(job_id)
+                self.queue.task_done()
+    
+    def _expire(self, job_id):
+        """Registrar un trabajo terminado y olvidar los más antiguos"""
+        with self.lock:
+            self.finished_jobs.append(job_id)
+            while len(self.finished_jobs) > self.MAX_FINISHED_JOBS:
+                self.jobs.pop(self.finished_jobs.popleft(), None)
+
 # Inicializar API
 patent_api = PatentSearchAPI()
+index_queue = IndexJobQueue(patent_api)
 
 # RUTAS DE LA API
 @app.route("/", methods=["GET"])
@@ -294,6 +650,7 @@ def home():
         "endpoints": {
             "search": "/api/search?q=<query>&limit=<number>",
             "setup": "/api/setup",
+            "setup_status": "/api/setup/status/<job_id>",
             "stats": "/api/stats",
             "search_by_field": "/api/search/<field>/<value>",
             "health": "/api/health"
@@ -317,15 +674,26 @@ def search_patents():
         if request.args.get("assignee"):
             filters["assignee"] = request.args.get("assignee")
         
+        # El cliente ya tiene esta respuesta si el corpus no cambió
+        etag = patent_api.search_etag(query, limit, filters)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
         logger.info(f"Search request: query='{query}', limit={limit}, filters={filters}")
         
         results = patent_api.search_patents(query, limit, filters)
         
-        return jsonify({
+        response = json_response({
             "query": query,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": current_timestamp(),
             **results
         })
+        if "error" not in results:
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+        return response
         
     except Exception as e:
         logger.error(f"Search endpoint error: {e}")
@@ -338,22 +706,24 @@ def search_by_field(field, value):
     try:
         limit = int(request.args.get("limit", 10))
         
-        if patent_api.engine_type == "sqlite":
-            try:
+        if not patent_api.search_engine:
+            return jsonify({"error": "No search engine available", "results": []}), 503
+        
+        try:
+            if patent_api.engine_type == "sqlite":
                 results = patent_api.search_engine.search_by_field(field, value, limit)
-                return jsonify({
-                    "field": field,
-                    "value": value,
-                    "results": results,
-                    "total": len(results)
-                })
-            except ValueError as e:
-                return jsonify({"error": str(e)}), 400
-        else:
-            # Para Elasticsearch, usar búsqueda regular con filtro
-            filters = {field: value}
-            results = patent_api.search_patents("*", limit, filters)
-            return jsonify(results)
+            else:
+                # Para Elasticsearch, consulta de solo filtro
+                results = patent_api.search_by_field_elasticsearch(field, value, limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify({
+            "field": field,
+            "value": value,
+            "results": results,
+            "total": len(results)
+        })
             
     except Exception as e:
         logger.error(f"Search by field error: {e}")
@@ -366,11 +736,11 @@ def get_statistics():
     try:
         aggregations = patent_api.get_aggregations()
         
-        return jsonify({
+        return json_response({
             "search_engine": patent_api.engine_type,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": current_timestamp(),
             "aggregations": aggregations
-        })
+        }, non_str_keys=True)
         
     except Exception as e:
         logger.error(f"Stats endpoint error: {e}")
@@ -388,16 +758,33 @@ def setup_data():
         
         logger.info(f"Setup request: file_path={patents_file}")
         
-        result = patent_api.load_data(patents_file)
+        # La indexación corre en segundo plano; el cliente consulta el estado
+        try:
+            job = index_queue.submit(patents_file)
+        except queue.Full:
+            return jsonify({"error": "Too many setup jobs queued", "success": False}), 503
         
-        status_code = 200 if result.get("success") else 500
-        return jsonify(result), status_code
+        return jsonify({
+            "success": True,
+            "status_url": f"/api/setup/status/{job['job_id']}",
+            **job
+        }), 202
         
     except Exception as e:
         logger.error(f"Setup endpoint error: {e}")
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e), "success": False}), 500
 
+@app.route("/api/setup/status/<job_id>", methods=["GET"])
+def setup_status(job_id):
+    """Estado de un trabajo de carga de datos"""
+    job = index_queue.get_status(job_id)
+    
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job)
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Check de salud del sistema"""
@@ -421,7 +808,7 @@ def health_check():
             "sqlite_available": SQLITE_AVAILABLE,
             "has_data": has_data,
             "total_patents": total_patents,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": current_timestamp()
         })
         
     except Exception as e:
@@ -429,7 +816,7 @@ def health_check():
         return jsonify({
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": current_timestamp()
         }), 500
 
 @app.errorhandler(404)
@@ -464,7 +851,8 @@ if __name__ == "__main__":
     print("   GET  /                    - API info")
     print("   GET  /api/search?q=<query> - Search patents")
     print("   GET  /api/stats           - Get statistics")
-    print("   POST /api/setup           - Load patent data")
+    print("   POST /api/setup           - Load patent data (background job)")
+    print("   GET  /api/setup/status/<id> - Setup job status")
     print("   GET  /api/health          - Health check")
     print("\n🔍 Example searches:")
     print("   /api/search?q=artificial intelligence")
@@ -472,5 +860,5 @@ if __name__ == "__main__":
     print("   /api/search?q=machine learning&assignee=Google")
     print("\n" + "=" * 50)
     
-    # Ejecutar servidor con threading habilitado
-    app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
\ No newline at end of file
+    # Servidor de desarrollo; en producción usar gunicorn -c gunicorn.conf.py app:app
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
\ No newline at end of file
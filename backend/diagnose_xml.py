@@ -1,6 +1,96 @@
 # backend/diagnose_xml.py
 import os
 import re
+import mmap
+from collections import Counter
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Tamaño de la muestra analizada al inicio del archivo
+SAMPLE_BYTES = 2 * 1024 * 1024
+
+# Elementos de patente a contar en el análisis
+PATENT_ELEMENTS = [
+    'us-patent-application',
+    'patent-application-publication',
+    'us-patent-grant',
+    'invention-title',
+    'abstract',
+    'assignee'
+]
+
+# Un solo patrón con grupos nombrados (sin numpy): una pasada cuenta todo
+ELEMENT_SCANNER = re.compile((
+    r'(?P<xml_declaration><\?xml[^>]*\?>)|(?i:' +
+    '|'.join(f'(?P<{name.replace("-", "_")}><{name}[^>]*>)' for name in PATENT_ELEMENTS) +
+    ')'
+).encode())
+
+if NUMPY_AVAILABLE:
+    # Tabla ASCII -> minúsculas para comparar nombres de etiqueta sin regex
+    LOWERCASE_TABLE = np.arange(256, dtype=np.uint8)
+    LOWERCASE_TABLE[ord('A'):ord('Z') + 1] += 32
+
+def count_tag_prefix(buf, starts, prefix, ignore_case=False):
+    """Contar posiciones de `starts` donde el buffer comienza con `prefix`"""
+    pattern = np.frombuffer(prefix, dtype=np.uint8)
+    starts = starts[starts + len(pattern) <= len(buf)]
+    
+    # Matriz (aperturas x len(prefix)) comparada de una vez
+    windows = buf[starts[:, None] + np.arange(len(pattern))]
+    if ignore_case:
+        windows = LOWERCASE_TABLE[windows]
+    
+    return int(np.count_nonzero((windows == pattern).all(axis=1)))
+
+def count_elements(content):
+    """Contar declaraciones XML y elementos de patente en el buffer"""
+    if not NUMPY_AVAILABLE:
+        return Counter(m.lastgroup for m in ELEMENT_SCANNER.finditer(content))
+    
+    buf = np.frombuffer(content, dtype=np.uint8)
+    
+    # Posición siguiente a cada '<' del buffer
+    starts = np.flatnonzero(buf == ord('<')) + 1
+    
+    counts = Counter()
+    counts['xml_declaration'] = count_tag_prefix(buf, starts, b'?xml')
+    for name in PATENT_ELEMENTS:
+        counts[name.replace('-', '_')] = count_tag_prefix(buf, starts, name.encode(), ignore_case=True)
+    
+    return counts
+
+# Marcadores que indican el posible inicio de un documento
+DOC_START_MARKERS = (b'<?xml', b'<us-patent-application', b'<patent-application-publication')
+
+def find_document_starts(content):
+    """Líneas (desde 1) con posibles inicios de documento, recorriendo con bytes.find"""
+    next_hits = {marker: content.find(marker) for marker in DOC_START_MARKERS}
+    doc_starts = []
+    line, line_pos = 1, 0
+    
+    while True:
+        pending = [pos for pos in next_hits.values() if pos >= 0]
+        if not pending:
+            break
+        
+        pos = min(pending)
+        
+        # Convertir offset a número de línea contando solo el tramo nuevo
+        line += content.count(b'\n', line_pos, pos)
+        line_pos = pos
+        if not doc_starts or doc_starts[-1] != line:
+            doc_starts.append(line)
+        
+        for marker, hit in next_hits.items():
+            if hit == pos:
+                next_hits[marker] = content.find(marker, pos + 1)
+    
+    return doc_starts
 
 def diagnose_xml_file(file_path):
     """Diagnosticar estructura del archivo XML de USPTO"""
@@ -12,50 +102,37 @@ def diagnose_xml_file(file_path):
         return
     
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            # Leer primeras 10000 líneas para análisis
-            lines = []
-            for i, line in enumerate(f):
-                lines.append(line)
-                if i > 10000:
-                    break
+        file_size = os.path.getsize(file_path)
+        if file_size == 0:
+            print("❌ File is empty")
+            return
         
-        content = ''.join(lines)
+        # Mapear el archivo y analizar solo los primeros bytes, sin copiar línea a línea
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                content = mm[:SAMPLE_BYTES]
         
-        print(f"📊 File size: {os.path.getsize(file_path) / (1024*1024):.1f} MB")
-        print(f"📝 Lines analyzed: {len(lines)}")
+        line_count = content.count(b'\n') + (0 if content.endswith(b'\n') else 1)
         
-        # Buscar patrones XML
-        xml_declarations = re.findall(r'<\?xml[^>]*\?>', content)
-        print(f"🔖 XML declarations found: {len(xml_declarations)}")
+        print(f"📊 File size: {file_size / (1024*1024):.1f} MB")
+        print(f"📝 Lines analyzed: {line_count}")
         
-        # Buscar elementos de patente
-        patent_patterns = [
-            ('us-patent-application', r'<us-patent-application[^>]*>'),
-            ('patent-application-publication', r'<patent-application-publication[^>]*>'),
-            ('us-patent-grant', r'<us-patent-grant[^>]*>'),
-            ('invention-title', r'<invention-title[^>]*>'),
-            ('abstract', r'<abstract[^>]*>'),
-            ('assignee', r'<assignee[^>]*>')
-        ]
+        # Contar declaraciones XML y elementos de patente
+        counts = count_elements(content)
+        print(f"🔖 XML declarations found: {counts['xml_declaration']}")
         
         print("\n📋 Patent-related elements found:")
-        for name, pattern in patent_patterns:
-            matches = re.findall(pattern, content, re.IGNORECASE)
-            print(f"   {name}: {len(matches)}")
+        for name in PATENT_ELEMENTS:
+            print(f"   {name}: {counts[name.replace('-', '_')]}")
         
         # Mostrar primeras líneas
         print(f"\n📄 First 10 lines:")
-        for i, line in enumerate(lines[:10]):
-            print(f"   {i+1:2d}: {line.strip()}")
+        first_lines = content.split(b'\n', 10)[:min(10, line_count)]
+        for i, line in enumerate(first_lines):
+            print(f"   {i+1:2d}: {line.decode('utf-8', errors='ignore').strip()}")
         
         # Buscar posibles inicios de documentos
-        doc_starts = []
-        for i, line in enumerate(lines):
-            if ('<?xml' in line or 
-                '<us-patent-application' in line or 
-                '<patent-application-publication' in line):
-                doc_starts.append(i + 1)
+        doc_starts = find_document_starts(content)
         
         print(f"\n🎯 Potential document starts at lines: {doc_starts[:10]}")
         
@@ -0,0 +1,19 @@
+# backend/gunicorn.conf.py - Servidor de producción
+# Uso (desde backend/): gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Workers con threads reales: sqlite3 libera el GIL durante cada consulta pero no
+# cede a un hub de gevent, así que con greenlets las búsquedas (y la carga de
+# /api/setup) se serializarían dentro del worker
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# La cola de /api/setup y la caché de estadísticas viven en cada proceso:
+# con más de un worker, el estado de un trabajo solo lo conoce el worker
+# que lo aceptó
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+
+timeout = 120
+accesslog = "-"
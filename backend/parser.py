@@ -1,10 +1,237 @@
 # backend/parser.py
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
+import hashlib
 import json
+import mmap
 import os
 import re
+import sys
 from datetime import datetime
-import pandas as pd
+from contextlib import closing
+from collections import defaultdict, Counter
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+# Serializador JSON en C (opcional) para escribir la salida
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Expresiones regulares de limpieza, compiladas una vez
+WHITESPACE_RE = re.compile(r'\s+')
+DISALLOWED_CHARS_RE = re.compile(r'[^\w\s\-\.,;:()\[\]]')
+NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Marcador de inicio de cada documento en archivos concatenados
+XML_DECLARATION = b'<?xml version="1.0"'
+
+# Opciones de libxml2 compartidas por todos los parseos: sin nodos en blanco,
+# comentarios ni IDs (solo ruido para la extracción) y sin entidades externas ni red (XXE)
+XML_PARSER_OPTIONS = dict(
+    remove_blank_text=True,
+    remove_comments=True,
+    remove_pis=True,
+    collect_ids=False,
+    huge_tree=True,
+    resolve_entities=False,
+    no_network=True
+)
+
+# Etiquetas raíz de cada documento de patente en los volcados USPTO
+PATENT_ROOT_TAGS = ('us-patent-application', 'patent-application-publication', 'us-patent-grant')
+
+# Alternativas de cada campo unidas en una sola XPath compilada: libxml2 las
+# evalúa en un recorrido y devuelve los nodos en orden de documento
+def union_xpath(*paths):
+    """Compilar una unión XPath a partir de rutas alternativas"""
+    return ET.XPath(' | '.join(paths))
+
+ID_XPATH = union_xpath(
+    './/document-id/doc-number',
+    './/publication-reference//doc-number',
+    './/application-reference//doc-number',
+    './/subdoc-bibliographic-information//document-id/doc-number',
+    './/patent-number',
+    './/application-number'
+)
+APP_DATE_XPATH = union_xpath(
+    './/application-reference//date',
+    './/filing-date',
+    './/subdoc-bibliographic-information//filing-date'
+)
+PUB_DATE_XPATH = union_xpath(
+    './/publication-reference//date',
+    './/publication-date',
+    './/subdoc-bibliographic-information//publication-date'
+)
+IPC_XPATH = union_xpath(
+    './/classifications-ipc//main-classification',
+    './/classification-ipc//main-classification',
+    './/ipc-classification',
+    './/classification-ipc'
+)
+US_CLASS_XPATH = union_xpath(
+    './/classification-us//main-classification',
+    './/us-classification',
+    './/classification-national'
+)
+
+# Categorías basadas en IPC
+IPC_CATEGORIES = {
+    'A': 'human_necessities',
+    'B': 'performing_operations',
+    'C': 'chemistry_metallurgy',
+    'D': 'textiles_paper',
+    'E': 'fixed_constructions',
+    'F': 'mechanical_engineering',
+    'G': 'physics',
+    'H': 'electricity'
+}
+
+# Subcategorías más específicas: (patrón para IPC, patrón en minúsculas para título)
+SPECIFIC_PATTERNS = {
+    category: [(pattern, pattern.lower()) for pattern in patterns]
+    for category, patterns in {
+        'artificial_intelligence': ['G06N', 'AI', 'machine learning', 'neural network'],
+        'telecommunications': ['H04', 'communication', 'wireless', 'network'],
+        'biotechnology': ['C12', 'A61', 'genetic', 'biological', 'medical'],
+        'semiconductors': ['H01L', 'semiconductor', 'transistor', 'chip'],
+        'automotive': ['B60', 'vehicle', 'automotive', 'car'],
+        'energy': ['H02', 'F03', 'solar', 'battery', 'energy'],
+    }.items()
+}
+
+@lru_cache(maxsize=1024)
+def _ipc_category(ipc_class: str):
+    """(posición en SPECIFIC_PATTERNS, categoría) que decide solo el IPC, memoizada
+    
+    Los códigos IPC se repiten mucho entre patentes; los títulos no, así que
+    quedan fuera de la caché.
+    """
+    for position, (category, patterns) in enumerate(SPECIFIC_PATTERNS.items()):
+        if any(pattern in ipc_class for pattern, _ in patterns):
+            return position, category
+    
+    # Fallback a categoría IPC general
+    first_char = ipc_class[0].upper()
+    return len(SPECIFIC_PATTERNS), IPC_CATEGORIES.get(first_char, 'other')
+
+def _categorize(ipc_class: str, title_lower: str) -> str:
+    """Categoría para un par (IPC, título en minúsculas)"""
+    ipc_position, ipc_category = _ipc_category(ipc_class)
+    
+    # Solo las categorías anteriores a la del IPC pueden ganarle por el título
+    for category, patterns in islice(SPECIFIC_PATTERNS.items(), ipc_position):
+        if any(pattern_lower in title_lower for _, pattern_lower in patterns):
+            return category
+    
+    return ipc_category
+
+def encode_patent(patent):
+    """Serializar una patente a bytes JSON (orjson si está disponible)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(patent, option=orjson.OPT_INDENT_2)
+    return json.dumps(patent, indent=2, ensure_ascii=False).encode('utf-8')
+
+def iter_xml_files(directory):
+    """Generar rutas .xml bajo directory con os.scandir (mismo orden que os.walk)"""
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Como os.walk: no se siguen enlaces simbólicos a directorios
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif entry.name.endswith('.xml'):
+                    yield entry.path
+    except OSError:
+        return
+    
+    for subdir in subdirs:
+        yield from iter_xml_files(subdir)
+
+class ConcatenatedXMLReader:
+    """Lector tipo archivo que une documentos XML concatenados bajo una raíz sintética
+    
+    Omite las líneas de declaración XML y DOCTYPE de cada documento para que
+    iterparse vea un único documento bien formado.
+    """
+    
+    def __init__(self, f):
+        self.f = f
+        self.pending = b'<uspto-documents>'
+        self.finished = False
+    
+    def read(self, size=-1):
+        chunks = [self.pending]
+        length = len(self.pending)
+        self.pending = b''
+        
+        while not self.finished and (size < 0 or length < size):
+            line = self.f.readline()
+            if not line:
+                chunks.append(b'</uspto-documents>')
+                self.finished = True
+                break
+            
+            stripped = line.lstrip()
+            if stripped.startswith(b'<?xml') or stripped.startswith(b'<!DOCTYPE'):
+                continue
+            
+            chunks.append(line)
+            length += len(line)
+        
+        return b''.join(chunks)
+
+class DatasetStats:
+    """Estadísticas del dataset acumuladas patente a patente (sin guardar las patentes)"""
+    
+    def __init__(self):
+        self.total = 0
+        self.assignees = Counter()
+        self.categories = Counter()
+        self.ipc_classes = Counter()
+        self.earliest = None
+        self.latest = None
+        self.title_length = 0
+        self.abstract_length = 0
+    
+    def add(self, patent):
+        self.total += 1
+        self.assignees[patent.get('assignee')] += 1
+        self.categories[patent.get('category')] += 1
+        self.ipc_classes[patent.get('ipc_class')] += 1
+        
+        application_date = patent.get('application_date')
+        if application_date:
+            if self.earliest is None or application_date < self.earliest:
+                self.earliest = application_date
+            if self.latest is None or application_date > self.latest:
+                self.latest = application_date
+        
+        self.title_length += len(patent.get('title', ''))
+        self.abstract_length += len(patent.get('abstract', ''))
+    
+    def to_dict(self):
+        return {
+            "total_patents": self.total,
+            "unique_assignees": len([a for a in self.assignees if a is not None]),
+            "top_assignees": dict(self.assignees.most_common(10)),
+            "categories": dict(self.categories.most_common()),
+            "date_range": {
+                "earliest": self.earliest,
+                "latest": self.latest
+            },
+            "avg_lengths": {
+                "title": round(self.title_length / self.total, 1),
+                "abstract": round(self.abstract_length / self.total, 1)
+            },
+            "ipc_distribution": dict(self.ipc_classes.most_common(10))
+        }
 
 class USPTOParser:
     def __init__(self):
@@ -13,50 +240,117 @@ class USPTOParser:
             'us': 'http://www.uspto.gov',
             'default': ''
         }
-        
+        self.xml_parser = ET.XMLParser(**XML_PARSER_OPTIONS)
+    
     def clean_text(self, text):
         """Limpiar texto extraído del XML"""
         if not text:
             return ""
         
         # Remover caracteres especiales y normalizar espacios
-        text = re.sub(r'\s+', ' ', text.strip())
-        text = re.sub(r'[^\w\s\-\.,;:()\[\]]', ' ', text)
+        text = WHITESPACE_RE.sub(' ', text.strip())
+        text = DISALLOWED_CHARS_RE.sub(' ', text)
         return text[:5000]  # Limitar longitud para eficiencia
     
-    def extract_text_content(self, element):
-        """Extraer todo el texto de un elemento XML recursivamente"""
+    def extract_text_content(self, element, max_chars=None):
+        """Extraer todo el texto de un elemento XML (itertext recorre el subárbol en C)
+        
+        Con max_chars deja de recorrer al superar ese largo ya normalizado,
+        útil para campos que luego se truncan (descripción).
+        """
         if element is None:
             return ""
         
+        if max_chars is None:
+            return ' '.join(text for text in (t.strip() for t in element.itertext()) if text)
+        
         texts = []
-        if element.text:
-            texts.append(element.text.strip())
-        
-        for child in element:
-            child_text = self.extract_text_content(child)
-            if child_text:
-                texts.append(child_text)
-            if child.tail:
-                texts.append(child.tail.strip())
-        
-        return ' '.join(filter(None, texts))
-    
-    def find_element_flexible(self, root, *possible_paths):
-        """Buscar elemento usando múltiples paths posibles"""
-        for path in possible_paths:
-            element = root.find(path)
-            if element is not None:
-                return element
+        length = 0
+        for text in element.itertext():
+            text = WHITESPACE_RE.sub(' ', text.strip())
+            if text:
+                texts.append(text)
+                length += len(text) + 1
+                if length > max_chars:
+                    break
+        
+        return ' '.join(texts)
+    
+    def index_descendants(self, patent_elem):
+        """Mapear nombre local -> elementos del subárbol en un solo recorrido"""
+        idx = defaultdict(list)
+        for el in patent_elem.iter(ET.Element):
+            tag = el.tag
+            if tag[0] == '{':
+                tag = tag.rsplit('}', 1)[1]
+            idx[tag].append(el)
+        return idx
+    
+    def find_element_flexible(self, idx, *names):
+        """Buscar el primer elemento del índice según nombres en orden de prioridad"""
+        for name in names:
+            elements = idx.get(name)
+            if elements:
+                return elements[0]
         return None
     
-    def parse_uspto_xml(self, xml_file_path):
+    def iter_patent_elements(self, xml_file_path):
+        """Generar cada elemento de patente en streaming, liberando el árbol ya procesado"""
+        with open(xml_file_path, 'rb') as f:
+            context = ET.iterparse(
+                ConcatenatedXMLReader(f),
+                events=('end',),
+                tag=PATENT_ROOT_TAGS,
+                recover=True,
+                **XML_PARSER_OPTIONS
+            )
+            
+            for _, elem in context:
+                yield elem
+                
+                # Liberar la patente y los hermanos anteriores: memoria O(una patente)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+    
+    def stream_uspto_xml(self, xml_file_path, max_patents=None):
+        """Parsear en streaming con iterparse; devuelve (patentes, elementos encontrados)"""
+        patents = []
+        found = 0
+        
+        with closing(self.iter_patent_elements(xml_file_path)) as elements:
+            for patent_elem in elements:
+                found += 1
+                try:
+                    patent_data = self.extract_patent_data_robust(patent_elem)
+                    if patent_data and patent_data.get('title') and patent_data.get('abstract'):
+                        patents.append(patent_data)
+                except Exception as e:
+                    print(f"    Error processing patent {found}: {e}")
+                    continue
+                
+                if max_patents and len(patents) >= max_patents:
+                    break
+        
+        print(f"  Found {found} patent applications in {xml_file_path} (streaming)")
+        return patents, found
+    
+    def parse_uspto_xml(self, xml_file_path, max_patents=None):
         """Parsear archivo XML de USPTO - maneja múltiples documentos concatenados"""
         print(f"Parsing: {xml_file_path}")
         
-        # Primero intentar como archivo XML único
+        # Primero en streaming: no carga el archivo completo en memoria
+        try:
+            patents, found = self.stream_uspto_xml(xml_file_path, max_patents)
+            if found:
+                return patents
+            print("No patent elements found while streaming")
+        except ET.ParseError as e:
+            print(f"Streaming parse failed: {e}")
+        
+        # Fallback: archivo XML único con otra estructura
         try:
-            tree = ET.parse(xml_file_path)
+            tree = ET.parse(xml_file_path, self.xml_parser)
             root = tree.getroot()
             return self.extract_from_root(root, xml_file_path)
         except ET.ParseError as e:
@@ -66,104 +360,68 @@ class USPTOParser:
     
     def parse_concatenated_xml(self, xml_file_path):
         """Parsear archivo con múltiples documentos XML concatenados - FIXED"""
-        patents = []
-        
         try:
-            with open(xml_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            # FIXED: Mejor estrategia para separar documentos XML
-            # Buscar patrones de inicio completos de documento
-            documents = []
-            
-            # Patrón más robusto para encontrar documentos completos
-            pattern = r'<\?xml version="1\.0"[^>]*\?>\s*<!DOCTYPE[^>]*>\s*<us-patent-application[^>]*>.*?</us-patent-application>'
-            
-            # Usar re.DOTALL para que . coincida con newlines
-            matches = re.finditer(pattern, content, re.DOTALL)
-            
-            for match in matches:
-                documents.append(match.group(0))
-            
-            print(f"Found {len(documents)} complete XML documents using regex")
-            
-            # Si regex no funciona, usar método de líneas mejorado
-            if not documents:
-                documents = self.split_by_lines_improved(content)
-            
-            # Procesar cada documento individual
-            for i, doc_content in enumerate(documents[:50]):  # Limitar a 50 docs para prueba
-                try:
-                    # FIXED: Limpiar el documento antes de parsear
-                    doc_content = doc_content.strip()
-                    if not doc_content:
-                        continue
-                    
-                    root = ET.fromstring(doc_content)
-                    doc_patents = self.extract_from_root(root, f"{xml_file_path}_doc_{i}")
-                    patents.extend(doc_patents)
-                    
-                    if (i + 1) % 10 == 0:
-                        print(f"  Processed {i + 1} documents, {len(patents)} patents total...")
-                        
-                except ET.ParseError as e:
-                    print(f"  Error parsing document {i+1}: {e}")
-                    continue
-                except Exception as e:
-                    print(f"  Error processing document {i+1}: {e}")
-                    continue
-            
-            print(f"Successfully extracted {len(patents)} patents from concatenated XML")
-            return patents
+            # Bytes sin decodificar (libxml2 decodifica UTF-8) y mapeados con mmap:
+            # solo se copia a memoria de Python cada documento al parsearlo
+            with open(xml_file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    print(f"Empty file: {xml_file_path}")
+                    return []
+                
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    return self.parse_documents(content, xml_file_path)
             
         except Exception as e:
             print(f"Error reading file {xml_file_path}: {e}")
             return []
     
-    def split_by_lines_improved(self, content):
-        """FIXED: Método mejorado para separar documentos por líneas"""
-        documents = []
-        current_doc = ""
-        doc_started = False
-        doc_depth = 0
+    def parse_documents(self, content, xml_file_path):
+        """Parsear cada documento XML contenido en el buffer"""
+        patents = []
         
-        lines = content.split('\n')
+        # Separar documentos por la declaración XML con find (sin backtracking de regex)
+        spans = self.find_document_spans(content)
         
-        for line in lines:
-            line_stripped = line.strip()
-            
-            # Detectar inicio de nuevo documento
-            if line_stripped.startswith('<?xml version="1.0"'):
-                # Si ya teníamos un documento, guardarlo
-                if doc_started and current_doc.strip():
-                    documents.append(current_doc.strip())
-                
-                # Iniciar nuevo documento
-                current_doc = line + '\n'
-                doc_started = True
-                doc_depth = 0
+        print(f"Found {len(spans)} XML documents by declaration marker")
+        
+        # Sin declaraciones no hay documentos que separar (el parseo como XML único ya falló)
+        documents = (content[start:end] for start, end in spans)
+        
+        # Procesar cada documento individual
+        for i, doc_content in enumerate(islice(documents, 50)):  # Limitar a 50 docs para prueba
+            try:
+                # FIXED: Limpiar el documento antes de parsear
+                doc_content = doc_content.strip()
+                if not doc_content:
+                    continue
                 
-            elif doc_started:
-                current_doc += line + '\n'
+                root = ET.fromstring(doc_content, self.xml_parser)
+                doc_patents = self.extract_from_root(root, f"{xml_file_path}_doc_{i}")
+                patents.extend(doc_patents)
                 
-                # Contar depth de tags para saber cuándo termina el documento
-                if '<us-patent-application' in line_stripped:
-                    doc_depth += 1
-                elif '</us-patent-application>' in line_stripped:
-                    doc_depth -= 1
+                if (i + 1) % 10 == 0:
+                    print(f"  Processed {i + 1} documents, {len(patents)} patents total...")
                     
-                    # Si cerramos todos los us-patent-application, termina el documento
-                    if doc_depth == 0:
-                        documents.append(current_doc.strip())
-                        current_doc = ""
-                        doc_started = False
-        
-        # Agregar último documento si existe
-        if current_doc.strip():
-            documents.append(current_doc.strip())
+            except ET.ParseError as e:
+                print(f"  Error parsing document {i+1}: {e}")
+                continue
+            except Exception as e:
+                print(f"  Error processing document {i+1}: {e}")
+                continue
         
-        print(f"Found {len(documents)} XML documents using line-by-line method")
-        return documents
+        print(f"Successfully extracted {len(patents)} patents from concatenated XML")
+        return patents
+    
+    def find_document_spans(self, content):
+        """Posiciones (inicio, fin) de cada documento según su declaración XML"""
+        positions = []
+        i = content.find(XML_DECLARATION)
+        while i >= 0:
+            positions.append(i)
+            i = content.find(XML_DECLARATION, i + 1)
+        positions.append(len(content))
+        
+        return list(zip(positions, positions[1:]))
     
     def extract_from_root(self, root, source_info):
         """Extraer patentes de un elemento raíz XML"""
@@ -201,141 +459,108 @@ class USPTOParser:
         """Extraer datos de patente con múltiples estrategias de búsqueda"""
         patent_data = {}
         
+        # Un solo recorrido del subárbol; las búsquedas por nombre son O(1)
+        idx = self.index_descendants(patent_elem)
+        
         # 1. ID de Patente - múltiples ubicaciones posibles
         patent_data['id'] = self.extract_patent_id(patent_elem)
         
         # 2. Título
-        title_paths = [
-            './/invention-title',
-            './/title-of-invention', 
-            './/invention-title-text',
-            './/title'
-        ]
-        title_elem = self.find_element_flexible(patent_elem, *title_paths)
+        title_elem = self.find_element_flexible(idx, 'invention-title', 'title-of-invention', 'invention-title-text', 'title')
         patent_data['title'] = self.clean_text(self.extract_text_content(title_elem)) if title_elem is not None else "Untitled"
         
         # 3. Abstract
-        abstract_paths = [
-            './/abstract',
-            './/abstract-text',
-            './/subdoc-abstract'
-        ]
-        abstract_elem = self.find_element_flexible(patent_elem, *abstract_paths)
+        abstract_elem = self.find_element_flexible(idx, 'abstract', 'abstract-text', 'subdoc-abstract')
         patent_data['abstract'] = self.clean_text(self.extract_text_content(abstract_elem)) if abstract_elem is not None else "No abstract available"
         
-        # 4. Assignee (Empresa)
-        patent_data['assignee'] = self.extract_assignee_robust(patent_elem)
+        # Validar datos mínimos antes de extraer el resto (claims y descripción son lo más caro)
+        if len(patent_data['title']) < 5 or len(patent_data['abstract']) < 10:
+            return None
+        
+        # 4. Assignee (Empresa) - los campos muy repetidos se internan para compartir un solo str
+        patent_data['assignee'] = sys.intern(self.extract_assignee_robust(patent_elem, idx))
         
         # 5. Inventores
-        patent_data['inventors'] = self.extract_inventors_robust(patent_elem)
+        patent_data['inventors'] = self.extract_inventors_robust(patent_elem, idx)
         
         # 6. Fechas
-        patent_data.update(self.extract_dates_robust(patent_elem))
+        for key, date in self.extract_dates_robust(patent_elem).items():
+            patent_data[key] = sys.intern(date)
         
         # 7. Clasificaciones
         patent_data['ipc_classes'] = self.extract_classifications_robust(patent_elem)
-        patent_data['ipc_class'] = patent_data['ipc_classes'][0] if patent_data['ipc_classes'] else 'G06F'
+        patent_data['ipc_class'] = sys.intern(patent_data['ipc_classes'][0]) if patent_data['ipc_classes'] else 'G06F'
         
         # 8. Claims
-        claims_paths = [
-            './/claims',
-            './/claim',
-            './/subdoc-claims'
-        ]
-        claims_elem = self.find_element_flexible(patent_elem, *claims_paths)
+        claims_elem = self.find_element_flexible(idx, 'claims', 'claim', 'subdoc-claims')
         patent_data['claims'] = self.clean_text(self.extract_text_content(claims_elem)) if claims_elem is not None else "No claims available"
         
         # 9. Descripción
-        description_paths = [
-            './/description',
-            './/detailed-description',
-            './/subdoc-description'
-        ]
-        description_elem = self.find_element_flexible(patent_elem, *description_paths)
-        description_text = self.extract_text_content(description_elem) if description_elem is not None else ""
+        description_elem = self.find_element_flexible(idx, 'description', 'detailed-description', 'subdoc-description')
+        description_text = self.extract_text_content(description_elem, max_chars=3000) if description_elem is not None else ""
         patent_data['description'] = self.clean_text(description_text)[:3000]  # Limitar para eficiencia
         
         # 10. Categorización automática
-        patent_data['category'] = self.categorize_patent(patent_data['ipc_class'], patent_data['title'])
+        patent_data['category'] = sys.intern(self.categorize_patent(patent_data['ipc_class'], patent_data['title']))
         
-        # Validar datos mínimos
-        if len(patent_data['title']) < 5 or len(patent_data['abstract']) < 10:
-            return None
-            
         return patent_data
     
     def extract_patent_id(self, patent_elem):
         """Extraer ID de patente con múltiples estrategias"""
-        id_paths = [
-            './/document-id/doc-number',
-            './/publication-reference//doc-number',
-            './/application-reference//doc-number',
-            './/subdoc-bibliographic-information//document-id/doc-number',
-            './/patent-number',
-            './/application-number'
-        ]
-        
-        for path in id_paths:
-            id_elem = patent_elem.find(path)
-            if id_elem is not None and id_elem.text:
+        for id_elem in ID_XPATH(patent_elem):
+            if id_elem.text:
                 patent_id = id_elem.text.strip()
                 if patent_id:
                     return patent_id
         
-        # Generar ID único si no se encuentra
-        return f"PATENT_{hash(str(patent_elem))}"[:15]
+        # Generar ID estable a partir del contenido canónico si no se encuentra
+        digest = hashlib.blake2b(ET.tostring(patent_elem, method='c14n'), digest_size=8).hexdigest()
+        return f"PATENT_{digest}"
     
-    def extract_assignee_robust(self, patent_elem):
+    def extract_assignee_robust(self, patent_elem, idx):
         """Extraer assignee con múltiples estrategias"""
-        assignee_paths = [
-            './/assignees/assignee',
-            './/assignee',
-            './/subdoc-bibliographic-information//assignee'
-        ]
-        
-        for path in assignee_paths:
-            assignee_elem = patent_elem.find(path)
-            if assignee_elem is not None:
-                # Buscar nombre de organización
-                org_paths = [
-                    './/orgname',
-                    './/organization-name',
-                    './/assignee-name'
-                ]
-                
-                for org_path in org_paths:
-                    org_elem = assignee_elem.find(org_path)
-                    if org_elem is not None and org_elem.text:
-                        return org_elem.text.strip()
-                
-                # Si no es organización, buscar nombre de persona
-                first_name = assignee_elem.find('.//first-name')
-                last_name = assignee_elem.find('.//last-name')
-                
-                if first_name is not None and last_name is not None:
-                    return f"{first_name.text} {last_name.text}".strip()
+        assignees = idx.get('assignee', [])
+        
+        # Primero el declarado dentro de <assignees>, luego el primero del documento
+        in_list = [a for a in assignees if a.getparent().tag == 'assignees']
+        
+        for assignee_elem in in_list[:1] + assignees[:1]:
+            # Buscar nombre de organización
+            org_paths = [
+                './/orgname',
+                './/organization-name',
+                './/assignee-name'
+            ]
+            
+            for org_path in org_paths:
+                org_elem = assignee_elem.find(org_path)
+                if org_elem is not None and org_elem.text:
+                    return org_elem.text.strip()
+            
+            # Si no es organización, buscar nombre de persona
+            first_name = assignee_elem.find('.//first-name')
+            last_name = assignee_elem.find('.//last-name')
+            
+            if first_name is not None and last_name is not None:
+                return f"{first_name.text} {last_name.text}".strip()
         
         return "Unknown Assignee"
     
-    def extract_inventors_robust(self, patent_elem):
+    def extract_inventors_robust(self, patent_elem, idx):
         """Extraer inventores con múltiples estrategias"""
         inventors = []
+        seen = set()
         
-        inventor_paths = [
-            './/inventors/inventor',
-            './/inventor',
-            './/subdoc-bibliographic-information//inventor'
-        ]
-        
-        for path in inventor_paths:
-            for inventor_elem in patent_elem.findall(path):
-                first_name_elem = inventor_elem.find('.//first-name')
-                last_name_elem = inventor_elem.find('.//last-name')
-                
-                if first_name_elem is not None and last_name_elem is not None:
-                    name = f"{first_name_elem.text} {last_name_elem.text}".strip()
-                    if name not in inventors:
-                        inventors.append(name)
+        # <inventor> en cualquier nivel cubre también inventors/inventor y subdoc-bibliographic-information
+        for inventor_elem in idx.get('inventor', []):
+            first_name_elem = inventor_elem.find('.//first-name')
+            last_name_elem = inventor_elem.find('.//last-name')
+            
+            if first_name_elem is not None and last_name_elem is not None:
+                name = f"{first_name_elem.text} {last_name_elem.text}".strip()
+                if name not in seen:
+                    seen.add(name)
+                    inventors.append(name)
         
         return inventors if inventors else ["Unknown Inventor"]
     
@@ -343,31 +568,12 @@ class USPTOParser:
         """Extraer fechas con múltiples estrategias"""
         dates = {}
         
-        # Fecha de aplicación
-        app_date_paths = [
-            './/application-reference//date',
-            './/filing-date',
-            './/subdoc-bibliographic-information//filing-date'
-        ]
-        
-        for path in app_date_paths:
-            date_elem = patent_elem.find(path)
-            if date_elem is not None and date_elem.text:
-                dates['application_date'] = self.format_date(date_elem.text)
-                break
-        
-        # Fecha de publicación
-        pub_date_paths = [
-            './/publication-reference//date',
-            './/publication-date',
-            './/subdoc-bibliographic-information//publication-date'
-        ]
-        
-        for path in pub_date_paths:
-            date_elem = patent_elem.find(path)
-            if date_elem is not None and date_elem.text:
-                dates['publication_date'] = self.format_date(date_elem.text)
-                break
+        # Fecha de aplicación / publicación
+        for key, xpath in (('application_date', APP_DATE_XPATH), ('publication_date', PUB_DATE_XPATH)):
+            for date_elem in xpath(patent_elem):
+                if date_elem.text:
+                    dates[key] = self.format_date(date_elem.text)
+                    break
         
         # Defaults
         current_year = datetime.now().year
@@ -381,21 +587,17 @@ class USPTOParser:
     def format_date(self, date_str):
         """Formatear fecha USPTO a formato ISO"""
         try:
-            # USPTO típicamente usa YYYYMMDD
-            date_str = re.sub(r'[^\d]', '', date_str)
+            # USPTO típicamente usa YYYYMMDD: solo pasar por la regex si hay separadores
+            if not date_str.isdecimal():
+                date_str = NON_DIGIT_RE.sub('', date_str)
             
-            if len(date_str) >= 8:
-                year = date_str[:4]
-                month = date_str[4:6]
-                day = date_str[6:8]
-                return f"{year}-{month}-{day}"
-            elif len(date_str) >= 6:
-                year = date_str[:4]
-                month = date_str[4:6]
-                return f"{year}-{month}-01"
-            elif len(date_str) >= 4:
-                year = date_str[:4]
-                return f"{year}-01-01"
+            length = len(date_str)
+            if length >= 8:
+                return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
+            elif length >= 6:
+                return f"{date_str[:4]}-{date_str[4:6]}-01"
+            elif length >= 4:
+                return f"{date_str[:4]}-01-01"
         except:
             pass
         
@@ -406,157 +608,101 @@ class USPTOParser:
         classifications = []
         
         # Clasificaciones IPC
-        ipc_paths = [
-            './/classifications-ipc//main-classification',
-            './/classification-ipc//main-classification',
-            './/ipc-classification',
-            './/classification-ipc'
-        ]
-        
-        for path in ipc_paths:
-            for ipc_elem in patent_elem.findall(path):
-                if ipc_elem.text:
-                    classifications.append(ipc_elem.text.strip())
+        for ipc_elem in IPC_XPATH(patent_elem):
+            if ipc_elem.text:
+                classifications.append(ipc_elem.text.strip())
         
         # Clasificaciones US si no hay IPC
         if not classifications:
-            us_paths = [
-                './/classification-us//main-classification',
-                './/us-classification',
-                './/classification-national'
-            ]
-            
-            for path in us_paths:
-                for us_elem in patent_elem.findall(path):
-                    if us_elem.text:
-                        classifications.append(f"US{us_elem.text.strip()}")
+            for us_elem in US_CLASS_XPATH(patent_elem):
+                if us_elem.text:
+                    classifications.append(f"US{us_elem.text.strip()}")
         
         return classifications if classifications else ["G06F"]
     
     def categorize_patent(self, ipc_class, title=""):
         """Categorización automática basada en IPC y título"""
-        if not ipc_class:
-            ipc_class = "G06F"
-        
-        # Categorías basadas en IPC
-        ipc_categories = {
-            'A': 'human_necessities',
-            'B': 'performing_operations',
-            'C': 'chemistry_metallurgy',
-            'D': 'textiles_paper',
-            'E': 'fixed_constructions',
-            'F': 'mechanical_engineering',
-            'G': 'physics',
-            'H': 'electricity'
-        }
-        
-        # Subcategorías más específicas
-        specific_patterns = {
-            'artificial_intelligence': ['G06N', 'AI', 'machine learning', 'neural network'],
-            'telecommunications': ['H04', 'communication', 'wireless', 'network'],
-            'biotechnology': ['C12', 'A61', 'genetic', 'biological', 'medical'],
-            'semiconductors': ['H01L', 'semiconductor', 'transistor', 'chip'],
-            'automotive': ['B60', 'vehicle', 'automotive', 'car'],
-            'energy': ['H02', 'F03', 'solar', 'battery', 'energy'],
-        }
-        
-        title_lower = title.lower()
-        
-        # Buscar categorías específicas primero
-        for category, patterns in specific_patterns.items():
-            for pattern in patterns:
-                if pattern.lower() in title_lower or pattern in ipc_class:
-                    return category
-        
-        # Fallback a categoría IPC general
-        first_char = ipc_class[0].upper()
-        return ipc_categories.get(first_char, 'other')
+        return _categorize(ipc_class or "G06F", title.lower())
     
     def process_file(self, file_path, max_patents=None):
         """Procesar un archivo XML individual"""
-        patents = self.parse_uspto_xml(file_path)
+        patents = self.parse_uspto_xml(file_path, max_patents)
         
         if max_patents:
             patents = patents[:max_patents]
         
         return patents
     
-    def process_directory(self, input_dir="data/raw", output_file="data/processed/patents.json", max_files=None, max_patents_per_file=50):
-        """Procesar todos los archivos XML en directorio - FIXED"""
+    def process_directory(self, input_dir="data/raw", output_file="data/processed/patents.json", max_files=None, max_patents_per_file=50, max_workers=None):
+        """Procesar todos los archivos XML en directorio, en paralelo por archivo"""
         
-        # Buscar archivos XML
-        xml_files = []
-        for root, dirs, files in os.walk(input_dir):
-            for file in files:
-                if file.endswith('.xml'):
-                    xml_files.append(os.path.join(root, file))
+        # Buscar archivos XML (deja de recorrer al llegar a max_files)
+        xml_files = list(islice(iter_xml_files(input_dir), max_files or None))
         
         if not xml_files:
             print(f"No XML files found in {input_dir}")
-            return []
-        
-        if max_files:
-            xml_files = xml_files[:max_files]
+            return 0
         
         print(f"Processing {len(xml_files)} XML files...")
         
-        all_patents = []
-        
-        for i, xml_file in enumerate(xml_files):
-            print(f"\nFile {i+1}/{len(xml_files)}: {os.path.basename(xml_file)}")
-            
-            file_patents = self.process_file(xml_file, max_patents_per_file)
-            all_patents.extend(file_patents)
-            
-            print(f"  Extracted {len(file_patents)} patents (Total: {len(all_patents)})")
-            
-            # Pausa cada 5 archivos para no sobrecargar
-            if (i + 1) % 5 == 0:
-                print(f"Processed {i+1} files, {len(all_patents)} patents total...")
+        dataset_stats = DatasetStats()
         
         # FIXED: Crear directorio si no existe
         output_dir = os.path.dirname(output_file)
         if output_dir:  # Solo si hay directorio
             os.makedirs(output_dir, exist_ok=True)
         
-        # Guardar resultados
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(all_patents, f, indent=2, ensure_ascii=False)
+        # Se escribe a un temporal del mismo directorio y solo se reemplaza la salida
+        # anterior si todo el procesamiento termina bien
+        tmp_file = f"{output_file}.tmp"
+        
+        try:
+            # Cada archivo es independiente y el parseo es CPU-bound: un proceso por archivo.
+            # map conserva el orden de xml_files en la salida.
+            workers = min(len(xml_files), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor, open(tmp_file, 'wb') as f:
+                results = executor.map(process_file_worker, xml_files, repeat(max_patents_per_file))
+                
+                # Guardar resultados a medida que llegan: array JSON escrito registro a registro
+                f.write(b'[')
+                for i, (xml_file, file_patents) in enumerate(zip(xml_files, results)):
+                    print(f"\nFile {i+1}/{len(xml_files)}: {os.path.basename(xml_file)}")
+                    
+                    for patent in file_patents:
+                        f.write(b',\n' if dataset_stats.total else b'\n')
+                        f.write(encode_patent(patent))
+                        dataset_stats.add(patent)
+                    
+                    print(f"  Extracted {len(file_patents)} patents (Total: {dataset_stats.total})")
+                    
+                    if (i + 1) % 5 == 0:
+                        print(f"Processed {i+1} files, {dataset_stats.total} patents total...")
+                f.write(b'\n]\n' if dataset_stats.total else b']\n')
+            
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
         
         print(f"\n✅ Processing complete!")
         print(f"📁 Total files processed: {len(xml_files)}")
-        print(f"📄 Total patents extracted: {len(all_patents)}")
+        print(f"📄 Total patents extracted: {dataset_stats.total}")
         print(f"💾 Output saved to: {output_file}")
         
         # Crear estadísticas
-        if all_patents:  # Solo si hay patentes
-            self.create_summary_stats(all_patents, output_dir)
+        if dataset_stats.total:  # Solo si hay patentes
+            self.create_summary_stats(dataset_stats, output_dir)
         
-        return all_patents
+        return dataset_stats.total
     
-    def create_summary_stats(self, patents, output_dir):
+    def create_summary_stats(self, dataset_stats, output_dir):
         """FIXED: Crear estadísticas del dataset"""
-        if not patents:
+        if not dataset_stats.total:
             return
         
         try:
-            df = pd.DataFrame(patents)
-            
-            stats = {
-                "total_patents": len(patents),
-                "unique_assignees": df['assignee'].nunique(),
-                "top_assignees": df['assignee'].value_counts().head(10).to_dict(),
-                "categories": df['category'].value_counts().to_dict(),
-                "date_range": {
-                    "earliest": df['application_date'].min(),
-                    "latest": df['application_date'].max()
-                },
-                "avg_lengths": {
-                    "title": round(df['title'].str.len().mean(), 1),
-                    "abstract": round(df['abstract'].str.len().mean(), 1)
-                },
-                "ipc_distribution": df['ipc_class'].value_counts().head(10).to_dict()
-            }
+            stats = dataset_stats.to_dict()
 
             # FIXED: Usar output_dir correcto
             stats_file = os.path.join(output_dir, "dataset_stats.json") if output_dir else "dataset_stats.json"
@@ -573,6 +719,18 @@ class USPTOParser:
         except Exception as e:
             print(f"⚠️ Error creating stats: {e}")
 
+# Parser de cada proceso del pool: se crea una vez y se reutiliza para todos sus archivos
+_worker_parser = None
+
+def init_worker():
+    """Crear el USPTOParser (y su XMLParser de libxml2) del proceso"""
+    global _worker_parser
+    _worker_parser = USPTOParser()
+
+def process_file_worker(file_path, max_patents):
+    """Procesar un archivo en un proceso del pool con el parser del proceso"""
+    return _worker_parser.process_file(file_path, max_patents)
+
 if __name__ == "__main__":
     parser = USPTOParser()
     
@@ -596,15 +754,15 @@ if __name__ == "__main__":
         else:
             output_file = "data/processed/patents.json"
         
-        patents = parser.process_directory(
+        total_patents = parser.process_directory(
             input_dir=input_dir,
             output_file=output_file,
             max_files=3,  # Solo 3 archivos para empezar
             max_patents_per_file=100  # Max 100 patentes por archivo
         )
         
-        if patents:
-            print(f"\n✅ Success! Processed {len(patents)} patents")
+        if total_patents:
+            print(f"\n✅ Success! Processed {total_patents} patents")
             print("Next step: Run the Flask app to load data into Elasticsearch")
         else:
             print("❌ No patents were extracted. Check your XML files.")
@@ -1,14 +1,73 @@
 # backend/sqlite_search_engine.py - Thread-Safe Version
 import sqlite3
+import copy
 import json
 import os
+import queue
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 import math
-from collections import Counter
+from collections import Counter, OrderedDict
 import pandas as pd
 import threading
-from contextlib import contextmanager
+from itertools import islice, product
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from urllib.request import pathname2url
+
+# Parser JSON rápido (opcional) para filas antiguas con campos lista en JSON
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Separador de los campos lista (inventors, ipc_classes) guardados como TEXT plano:
+# sin corchetes ni comillas que codificar/parsear, y legible para FTS5 y LIKE
+LIST_SEPARATOR = '\n'
+
+def pack_list_field(values) -> str:
+    """Empaquetar una lista de strings en un TEXT separado por LIST_SEPARATOR (None = vacía)"""
+    return LIST_SEPARATOR.join(map(str, values or []))
+
+def unpack_list_field(text) -> list:
+    """Desempaquetar un campo lista leído de SQLite (acepta el formato JSON anterior)"""
+    if not text or text == 'null':
+        return []
+    
+    if text[0] == '[':
+        try:
+            return orjson.loads(text) if ORJSON_AVAILABLE else json.loads(text)
+        except ValueError:
+            pass
+    
+    return text.split(LIST_SEPARATOR)
+
+# Términos técnicos comunes en patentes, contados como subcadenas sin distinguir mayúsculas
+TECH_TERMS = (
+    'system', 'method', 'apparatus', 'device', 'process',
+    'invention', 'embodiment', 'implementation', 'technology',
+    'algorithm', 'network', 'computer', 'software', 'hardware'
+)
+
+# Motor RE2 (opcional): autómata sin backtracking para limpiar consultas no ASCII
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+# Caracteres que no son de palabra ni espacio se reemplazan por espacios en las consultas.
+# En RE2 \w es solo ASCII: letras y números Unicode, como \w de re (las marcas combinantes
+# no son de palabra en ninguno). Los espacios no ASCII que RE2 reemplaza dan los mismos términos
+NON_WORD_PATTERN = r'[^\w\s]'
+RE2_NON_WORD_PATTERN = r'[^\p{L}\p{N}_\s]'
+NON_WORD_RE = (
+    re2.compile(RE2_NON_WORD_PATTERN) if RE2_AVAILABLE else re.compile(NON_WORD_PATTERN)
+)
+ASCII_NON_WORD_TABLE = str.maketrans({
+    c: ' ' for c in map(chr, range(128)) if re.match(NON_WORD_PATTERN, c)
+})
 
 class SQLitePatentSearch:
     """
@@ -16,31 +75,190 @@ class SQLitePatentSearch:
     Version Thread-Safe para aplicaciones Flask
     """
     
+    # Sentencias preparadas que sqlite3 mantiene en caché por conexión
+    CACHED_STATEMENTS = 256
+    
+    # PRAGMAs de cada conexión nueva: WAL permite lectores concurrentes con un escritor
+    # y synchronous=NORMAL evita un fsync por commit
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+        "PRAGMA mmap_size=268435456"
+    )
+    
+    # Columnas de patents indexadas en patents_fts (tabla FTS5 de contenido externo)
+    FTS_COLUMNS = "id, title, abstract, description, claims, assignee, inventors, ipc_class, category"
+    
+    # Triggers que mantienen patents_fts sincronizado fila a fila. Con contenido externo FTS5
+    # solo guarda el índice invertido: se le pasa el rowid de patents y, para borrar,
+    # los valores anteriores con el comando 'delete'
+    FTS_TRIGGERS = {
+        'patents_fts_insert': f"""
+            CREATE TRIGGER IF NOT EXISTS patents_fts_insert AFTER INSERT ON patents
+            BEGIN
+                INSERT INTO patents_fts(rowid, {FTS_COLUMNS})
+                VALUES (new.rowid, new.id, new.title, new.abstract, new.description, new.claims,
+                        new.assignee, new.inventors, new.ipc_class, new.category);
+            END
+        """,
+        'patents_fts_delete': f"""
+            CREATE TRIGGER IF NOT EXISTS patents_fts_delete AFTER DELETE ON patents
+            BEGIN
+                INSERT INTO patents_fts(patents_fts, rowid, {FTS_COLUMNS})
+                VALUES ('delete', old.rowid, old.id, old.title, old.abstract, old.description, old.claims,
+                        old.assignee, old.inventors, old.ipc_class, old.category);
+            END
+        """,
+        'patents_fts_update': f"""
+            CREATE TRIGGER IF NOT EXISTS patents_fts_update AFTER UPDATE ON patents
+            BEGIN
+                INSERT INTO patents_fts(patents_fts, rowid, {FTS_COLUMNS})
+                VALUES ('delete', old.rowid, old.id, old.title, old.abstract, old.description, old.claims,
+                        old.assignee, old.inventors, old.ipc_class, old.category);
+                INSERT INTO patents_fts(rowid, {FTS_COLUMNS})
+                VALUES (new.rowid, new.id, new.title, new.abstract, new.description, new.claims,
+                        new.assignee, new.inventors, new.ipc_class, new.category);
+            END
+        """
+    }
+    
+    # Pesos BM25 por columna de patents_fts, en orden de declaración:
+    # id (UNINDEXED), title, abstract, description, claims, assignee, inventors, ipc_class, category
+    BM25_WEIGHTS = (0.0, 3.0, 2.0, 1.0, 1.5, 0.5, 0.5, 0.5, 0.5)
+    
+    # bm25() es negativo (menor es mejor): se invierte y se da boost a categorías tecnológicas
+    SCORE_EXPRESSION = f"""
+        -bm25(patents_fts, {', '.join(map(str, BM25_WEIGHTS))})
+        * (CASE WHEN p.category IN ('artificial_intelligence', 'telecommunications') THEN 1.2 ELSE 1.0 END)
+    """
+    
+    # Columnas del vector simple (word_count, char_count, tech_terms) de cada patente
+    VECTOR_COLUMNS = ('word_count', 'char_count', 'tech_terms')
+    
+    # Conexiones de solo lectura abiertas como máximo (búsquedas concurrentes)
+    READ_POOL_SIZE = 8
+    
+    # Filtros opcionales de search, en el orden de sus parámetros: category, assignee, date_range
+    SEARCH_FILTERS = (
+        "p.category = ?",
+        "p.assignee LIKE ?",
+        "p.publication_date BETWEEN ? AND ?"
+    )
+    
+    # Columnas de patents que devuelven search y search_by_field, en el orden de row_to_result
+    RESULT_COLUMNS = (
+        "p.id, p.title, p.abstract, p.description, p.claims, p.assignee, p.inventors, "
+        "p.application_date, p.publication_date, p.ipc_class, p.ipc_classes, p.category, "
+        "p.word_count, p.char_count, p.tech_terms"
+    )
+    
+    # Consultas distintas que se guardan en la caché de resultados de search
+    SEARCH_CACHE_SIZE = 512
+    
+    # Filas por lote de executemany durante la indexación (solo para reportar progreso)
+    INSERT_BATCH_SIZE = 10000
+    
+    # Patentes por tarea cuando las filas se preparan en un pool de procesos
+    PREPARE_CHUNKSIZE = 64
+    
+    # Facetas precalculadas al indexar: campo -> (expresión agrupada, condición)
+    FACET_SOURCES = {
+        'assignee': ("assignee", "assignee != ''"),
+        'category': ("category", "1"),
+        'ipc_class': ("ipc_class", "ipc_class != ''"),
+        'year': ("substr(publication_date, 1, 4)", "length(publication_date) >= 4")
+    }
+    
     def __init__(self, db_path="patent_search.db"):
         self.db_path = db_path
-        self.local = threading.local()  # Thread-local storage
+        
+        # Una conexión de escritura serializada por lock y un pool acotado de lectura
+        self.write_conn = None
+        self.write_lock = threading.RLock()
+        self.read_pool = queue.Queue(maxsize=self.READ_POOL_SIZE)
+        self.read_pool_lock = threading.Lock()
+        self.read_conns_opened = 0
+        
+        # Caché LRU de resultados de search, vaciada al reindexar
+        self.search_cache = OrderedDict()
+        self.search_cache_lock = threading.Lock()
+        self.search_cache_generation = 0
+        
+        # SQL de search precalculado por combinación de filtros
+        self.search_sql = self.build_search_sql()
+        
         self.init_database()
     
+    def connect(self, read_only=False):
+        """Abrir una conexión SQLite configurada (de solo lectura si read_only)"""
+        if read_only:
+            database = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        else:
+            database = self.db_path
+        
+        conn = sqlite3.connect(
+            database,
+            uri=read_only,
+            check_same_thread=False,  # Las conexiones del pool pasan entre threads
+            timeout=30.0,  # Timeout para evitar bloqueos
+            cached_statements=self.CACHED_STATEMENTS  # Reutilizar sentencias compiladas
+        )
+        # Una sola vez por conexión (no aplica a bases en memoria)
+        if self.db_path != ':memory:':
+            for pragma in self.CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+        
+        return conn
+    
+    def acquire_read_connection(self):
+        """Tomar una conexión libre del pool, abriendo una nueva si no se llegó al límite"""
+        try:
+            return self.read_pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self.read_pool_lock:
+            if self.read_conns_opened < self.READ_POOL_SIZE:
+                conn = self.connect(read_only=True)
+                self.read_conns_opened += 1
+                return conn
+        
+        # Pool completo: esperar a que otra petición devuelva su conexión
+        return self.read_pool.get()
+    
     @contextmanager
-    def get_connection(self):
-        """Context manager para obtener conexión thread-safe"""
-        if not hasattr(self.local, 'conn') or self.local.conn is None:
-            self.local.conn = sqlite3.connect(
-                self.db_path, 
-                check_same_thread=False,  # Permitir uso entre threads
-                timeout=30.0  # Timeout para evitar bloqueos
-            )
-            self.local.conn.row_factory = sqlite3.Row
+    def get_connection(self, mode='read'):
+        """Context manager para obtener conexión thread-safe
         
+        mode='read' usa el pool de solo lectura; mode='write' la conexión única de escritura.
+        """
+        # Una base en memoria solo existe en su conexión: todo pasa por la de escritura
+        if mode == 'write' or self.db_path == ':memory:':
+            with self.write_lock:
+                if self.write_conn is None:
+                    self.write_conn = self.connect()
+                
+                try:
+                    yield self.write_conn
+                except Exception as e:
+                    self.write_conn.rollback()
+                    raise e
+            return
+        
+        conn = self.acquire_read_connection()
         try:
-            yield self.local.conn
+            yield conn
         except Exception as e:
-            self.local.conn.rollback()
+            conn.rollback()
             raise e
+        finally:
+            self.read_pool.put(conn)
     
     def init_database(self):
         """Inicializar base de datos SQLite con FTS5"""
-        with self.get_connection() as conn:
+        with self.get_connection('write') as conn:
             # Crear tabla principal de patentes
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS patents (
@@ -50,16 +268,39 @@ class SQLitePatentSearch:
                     description TEXT,
                     claims TEXT,
                     assignee TEXT,
-                    inventors TEXT, -- JSON array
+                    inventors TEXT, -- Lista separada por saltos de línea
                     application_date TEXT,
                     publication_date TEXT,
                     ipc_class TEXT,
-                    ipc_classes TEXT, -- JSON array
+                    ipc_classes TEXT, -- Lista separada por saltos de línea
                     category TEXT,
-                    content_vector TEXT -- Representación numérica para ranking
+                    -- Vector simple para ranking, en columnas enteras
+                    word_count INTEGER,
+                    char_count INTEGER,
+                    tech_terms INTEGER
                 )
             """)
             
+            # Bases anteriores guardaban el vector como JSON en content_vector
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(patents)")}
+            for column in self.VECTOR_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE patents ADD COLUMN {column} INTEGER")
+            if 'content_vector' in columns:
+                # Copiar [word_count, char_count, tech_terms] antes de quitar la columna
+                assignments = ', '.join(
+                    f"{column} = json_extract(content_vector, '$[{i}]')"
+                    for i, column in enumerate(self.VECTOR_COLUMNS)
+                )
+                conn.execute(f"""
+                    UPDATE patents SET {assignments}
+                    WHERE content_vector IS NOT NULL AND json_valid(content_vector)
+                """)
+                try:
+                    conn.execute("ALTER TABLE patents DROP COLUMN content_vector")
+                except sqlite3.OperationalError:
+                    pass  # SQLite < 3.35 no soporta DROP COLUMN: la columna queda en NULL
+            
             # Crear índice FTS5 para búsqueda full-text
             conn.execute("""
                 CREATE VIRTUAL TABLE IF NOT EXISTS patents_fts USING fts5(
@@ -77,35 +318,19 @@ class SQLitePatentSearch:
                 )
             """)
             
-            # Crear triggers para mantener FTS sincronizado
-            conn.execute("""
-                CREATE TRIGGER IF NOT EXISTS patents_fts_insert AFTER INSERT ON patents
-                BEGIN
-                    INSERT INTO patents_fts(
-                        id, title, abstract, description, claims, 
-                        assignee, inventors, ipc_class, category
-                    ) VALUES (
-                        new.id, new.title, new.abstract, new.description, new.claims,
-                        new.assignee, new.inventors, new.ipc_class, new.category
-                    );
-                END
-            """)
+            # Bases anteriores: triggers sin rowid ni borrado, el índice FTS puede no coincidir
+            legacy_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'patents_fts_delete'"
+            ).fetchone() is None
             
-            conn.execute("""
-                CREATE TRIGGER IF NOT EXISTS patents_fts_update AFTER UPDATE ON patents
-                BEGIN
-                    UPDATE patents_fts SET
-                        title = new.title,
-                        abstract = new.abstract,
-                        description = new.description,
-                        claims = new.claims,
-                        assignee = new.assignee,
-                        inventors = new.inventors,
-                        ipc_class = new.ipc_class,
-                        category = new.category
-                    WHERE id = new.id;
-                END
-            """)
+            # Crear triggers para mantener FTS sincronizado (recreados para que bases
+            # anteriores tomen la definición actual)
+            for trigger_name, trigger_sql in self.FTS_TRIGGERS.items():
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                conn.execute(trigger_sql)
+            
+            if legacy_fts and conn.execute("SELECT 1 FROM patents LIMIT 1").fetchone():
+                conn.execute("INSERT INTO patents_fts(patents_fts) VALUES('rebuild')")
             
             # Crear índices para consultas rápidas
             conn.execute("CREATE INDEX IF NOT EXISTS idx_assignee ON patents(assignee)")
@@ -113,195 +338,337 @@ class SQLitePatentSearch:
             conn.execute("CREATE INDEX IF NOT EXISTS idx_ipc_class ON patents(ipc_class)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_date ON patents(publication_date)")
             
+            # Índice de expresión para la faceta 'year': GROUP BY por año solo con páginas de índice
+            # y ya ordenado (publication_date lo hace cubriente para la condición de largo)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_pub_year
+                ON patents(substr(publication_date, 1, 4), publication_date)
+            """)
+            
+            # Conteos por faceta, calculados en la carga (lecturas O(K) en vez de O(N))
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS patent_facets (
+                    field TEXT NOT NULL,
+                    value TEXT,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (field, value)
+                )
+            """)
+            
+            # Bases creadas antes de existir la tabla de facetas
+            has_facets = conn.execute("SELECT 1 FROM patent_facets LIMIT 1").fetchone()
+            has_patents = conn.execute("SELECT 1 FROM patents LIMIT 1").fetchone()
+            if has_patents and not has_facets:
+                self.refresh_facets(conn)
+            
             conn.commit()
             print("✅ SQLite database initialized with FTS5 (Thread-Safe)")
     
-    def index_patents(self, patents_data: List[Dict]):
-        """Indexar patentes en la base de datos (Thread-Safe)"""
+    def index_patents(self, patents_data: Iterable[Dict], prepare_workers: int = 0) -> int:
+        """Indexar patentes en la base de datos (Thread-Safe)
+        
+        Acepta una ruta a JSON, una lista o cualquier iterable de patentes.
+        Con prepare_workers > 0 las filas se preparan en un pool de procesos: solo para
+        la carga desde línea de comandos; dentro del servidor se preparan en serie.
+        Devuelve el número de patentes indexadas.
+        """
         if isinstance(patents_data, str):
             with open(patents_data, 'r', encoding='utf-8') as f:
                 patents_data = json.load(f)
         
-        print(f"🔄 Indexing {len(patents_data)} patents (Thread-Safe)...")
+        print("🔄 Indexing patents (Thread-Safe)...")
         
-        with self.get_connection() as conn:
-            # Limpiar tabla existente
-            conn.execute("DELETE FROM patents")
-            conn.commit()
-            
-            # Insertar patentes
-            insert_query = """
-                INSERT INTO patents (
-                    id, title, abstract, description, claims, assignee,
-                    inventors, application_date, publication_date,
-                    ipc_class, ipc_classes, category, content_vector
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
+        with ExitStack() as stack:
+            executor = None
+            if prepare_workers:
+                # Todos los procesos se lanzan antes de BEGIN (una tarea vacía por proceso):
+                # ninguno arranca con la transacción de carga abierta
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=prepare_workers))
+                list(executor.map(int, range(prepare_workers)))
             
-            for i, patent in enumerate(patents_data):
-                try:
-                    # Preparar datos
-                    inventors_json = json.dumps(patent.get('inventors', []))
-                    ipc_classes_json = json.dumps(patent.get('ipc_classes', []))
-                    
-                    # Vector simple basado en longitud de contenido
-                    content_vector = self.create_simple_vector(patent)
-                    
-                    conn.execute(insert_query, (
-                        patent.get('id', f'patent_{i}'),
-                        patent.get('title', ''),
-                        patent.get('abstract', ''),
-                        patent.get('description', ''),
-                        patent.get('claims', ''),
-                        patent.get('assignee', ''),
-                        inventors_json,
-                        patent.get('application_date', ''),
-                        patent.get('publication_date', ''),
-                        patent.get('ipc_class', ''),
-                        ipc_classes_json,
-                        patent.get('category', ''),
-                        content_vector
-                    ))
-                    
-                    if (i + 1) % 100 == 0:
-                        print(f"   Indexed {i + 1} patents...")
-                        conn.commit()  # Commit periódico
-                        
-                except Exception as e:
-                    print(f"Error indexing patent {i}: {e}")
-                    continue
-            
-            conn.commit()
-            print(f"✅ Indexed {len(patents_data)} patents successfully")
+            indexed = self.load_patents(patents_data, executor)
+        
+        self.clear_search_cache()
         
         # Crear estadísticas
         self.create_search_stats()
+        
+        return indexed
     
-    def create_simple_vector(self, patent):
-        """Crear vector simple para ranking (TF-IDF básico)"""
-        text = f"{patent.get('title', '')} {patent.get('abstract', '')} {patent.get('claims', '')}"
-        word_count = len(text.split())
-        char_count = len(text)
-        tech_terms = self.count_tech_terms(text)
-        vector = json.dumps([word_count, char_count, tech_terms])
-        return vector
-    
-    def count_tech_terms(self, text):
-        """Contar términos técnicos comunes en patentes"""
-        tech_terms = [
-            'system', 'method', 'apparatus', 'device', 'process',
-            'invention', 'embodiment', 'implementation', 'technology',
-            'algorithm', 'network', 'computer', 'software', 'hardware'
-        ]
+    def load_patents(self, patents_data: Iterable[Dict], executor=None) -> int:
+        """Reemplazar el contenido de patents en una sola transacción"""
+        indexed = 0
+        
+        with self.get_connection('write') as conn:
+            # Carga masiva: más caché de páginas que el de las conexiones de búsqueda,
+            # solo mientras dura (write_conn es de larga vida)
+            previous_cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+            conn.execute("PRAGMA cache_size=-200000")
+            
+            try:
+                # Toda la recarga en una sola transacción: un único commit y, con WAL,
+                # las búsquedas siguen viendo los datos anteriores hasta que termina
+                conn.execute("BEGIN")
+                
+                # Sin triggers durante la carga: el índice FTS se reconstruye de una vez al final
+                for trigger_name in self.FTS_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                
+                # Limpiar tabla existente
+                conn.execute("DELETE FROM patents")
+                
+                # Insertar patentes (OR IGNORE omite duplicados y filas inválidas)
+                insert_query = """
+                    INSERT OR IGNORE INTO patents (
+                        id, title, abstract, description, claims, assignee,
+                        inventors, application_date, publication_date,
+                        ipc_class, ipc_classes, category,
+                        word_count, char_count, tech_terms
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                
+                rows = self.prepare_rows(patents_data, executor)
+                while True:
+                    batch = list(islice(rows, self.INSERT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    
+                    cursor = conn.executemany(insert_query, batch)
+                    indexed += cursor.rowcount
+                    print(f"   Indexed {indexed} patents...")
+                
+                # Reconstruir el índice FTS desde patents en una pasada y restaurar los triggers
+                conn.execute("INSERT INTO patents_fts(patents_fts) VALUES('rebuild')")
+                for trigger_sql in self.FTS_TRIGGERS.values():
+                    conn.execute(trigger_sql)
+                
+                # Fusionar segmentos del índice FTS tras la carga
+                conn.execute("INSERT INTO patents_fts(patents_fts) VALUES('optimize')")
+                
+                self.refresh_facets(conn)
+                
+                # Estadísticas del planificador para los índices y el JOIN con FTS, con los datos nuevos
+                conn.execute("ANALYZE")
+                conn.execute("PRAGMA optimize")
+                conn.commit()
+                print(f"✅ Indexed {indexed} patents successfully")
+                
+                # Compactar las páginas liberadas por la recarga (VACUUM no admite transacción abierta)
+                conn.execute("VACUUM")
+            finally:
+                conn.execute(f"PRAGMA cache_size={previous_cache_size}")
         
+        return indexed
+    
+    def refresh_facets(self, conn):
+        """Recalcular la tabla patent_facets a partir de patents (un solo INSERT con UNION ALL)"""
+        conn.execute("DELETE FROM patent_facets")
+        
+        selects = " UNION ALL ".join(
+            f"SELECT ?, {expression}, COUNT(*) FROM patents WHERE {condition} GROUP BY {expression}"
+            for expression, condition in self.FACET_SOURCES.values()
+        )
+        conn.execute(f"INSERT INTO patent_facets (field, value, count) {selects}", tuple(self.FACET_SOURCES))
+    
+    def prepare_rows(self, patents_data: Iterable[Dict], executor=None):
+        """Generar tuplas listas para INSERT, en serie o por lotes en el executor dado
+        
+        map conserva el orden de entrada; SQLite sigue con un único escritor.
+        """
+        items = enumerate(patents_data)
+        
+        if executor is None:
+            for i, patent in items:
+                row = self.prepare_row(i, patent)
+                if row is not None:
+                    yield row
+            return
+        
+        while True:
+            batch = list(islice(items, self.INSERT_BATCH_SIZE))
+            if not batch:
+                break
+            
+            for row in executor.map(prepare_row_worker, batch, chunksize=self.PREPARE_CHUNKSIZE):
+                if row is not None:
+                    yield row
+    
+    @classmethod
+    def prepare_row(cls, i, patent):
+        """Tupla lista para INSERT a partir de una patente (None si es inválida)"""
+        try:
+            # Preparar datos
+            inventors_text = pack_list_field(patent.get('inventors', []))
+            ipc_classes_text = pack_list_field(patent.get('ipc_classes', []))
+            
+            # Vector simple basado en longitud de contenido
+            word_count, char_count, tech_terms = cls.create_simple_vector(patent)
+            
+            return (
+                patent.get('id', f'patent_{i}'),
+                patent.get('title', ''),
+                patent.get('abstract', ''),
+                patent.get('description', ''),
+                patent.get('claims', ''),
+                patent.get('assignee', ''),
+                inventors_text,
+                patent.get('application_date', ''),
+                patent.get('publication_date', ''),
+                patent.get('ipc_class', ''),
+                ipc_classes_text,
+                patent.get('category', ''),
+                word_count,
+                char_count,
+                tech_terms
+            )
+        except Exception as e:
+            print(f"Error indexing patent {i}: {e}")
+            return None
+    
+    @classmethod
+    def create_simple_vector(cls, patent):
+        """Crear vector simple para ranking: (palabras, caracteres, términos técnicos)"""
+        text = f"{patent.get('title', '')} {patent.get('abstract', '')} {patent.get('claims', '')}"
+        return len(text.split()), len(text), cls.count_tech_terms(text)
+    
+    @classmethod
+    def count_tech_terms(cls, text):
+        """Contar términos técnicos comunes en patentes (str.count en C sobre el texto en minúsculas)"""
         text_lower = text.lower()
-        return sum(text_lower.count(term) for term in tech_terms)
+        return sum(text_lower.count(term) for term in TECH_TERMS)
     
     def search(self, query: str, limit: int = 10, category: str = None, 
                assignee: str = None, date_range: tuple = None) -> List[Dict]:
-        """Búsqueda semántica de patentes (Thread-Safe)"""
+        """Búsqueda semántica de patentes (Thread-Safe), con caché LRU por consulta"""
+        key = (query, limit, category, assignee, tuple(date_range) if date_range else None)
         
-        fts_query = self.prepare_fts_query(query)
+        with self.search_cache_lock:
+            cached = self.search_cache.get(key)
+            if cached is not None:
+                self.search_cache.move_to_end(key)
+            generation = self.search_cache_generation
         
-        # Query base con FTS
-        base_query = """
-            SELECT p.*, rank
-            FROM patents_fts 
-            JOIN patents p ON patents_fts.id = p.id
-            WHERE patents_fts MATCH ?
-        """
+        # Copias: quien llama puede modificar los resultados sin tocar la caché
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        results = self.execute_search(query, limit, category, assignee, date_range)
+        
+        with self.search_cache_lock:
+            # Descartar resultados calculados antes de una reindexación
+            if generation == self.search_cache_generation:
+                self.search_cache[key] = copy.deepcopy(results)
+                if len(self.search_cache) > self.SEARCH_CACHE_SIZE:
+                    self.search_cache.popitem(last=False)
+        
+        return results
+    
+    def clear_search_cache(self):
+        """Vaciar la caché de búsquedas (tras cambiar los datos indexados)"""
+        with self.search_cache_lock:
+            self.search_cache.clear()
+            self.search_cache_generation += 1
+    
+    def build_search_sql(self) -> Dict[tuple, str]:
+        """Armar el SQL de search para cada combinación (category, assignee, date_range)"""
+        search_sql = {}
+        
+        for enabled in product((False, True), repeat=len(self.SEARCH_FILTERS)):
+            # Query base con FTS: score BM25 nativo con pesos por columna (mayor es mejor)
+            query = f"""
+                SELECT {self.RESULT_COLUMNS}, {self.SCORE_EXPRESSION} AS score
+                FROM patents_fts 
+                JOIN patents p ON p.rowid = patents_fts.rowid
+                WHERE patents_fts MATCH ?
+            """
+            
+            # Agregar condiciones
+            conditions = [condition for condition, on in zip(self.SEARCH_FILTERS, enabled) if on]
+            if conditions:
+                query += " AND " + " AND ".join(conditions)
+            
+            # Ordenar por relevancia FTS y limitar
+            query += " ORDER BY score DESC LIMIT ?"
+            search_sql[enabled] = query
+        
+        return search_sql
+    
+    def execute_search(self, query: str, limit: int, category: str = None,
+                       assignee: str = None, date_range: tuple = None) -> List[Dict]:
+        """Ejecutar la búsqueda FTS en SQLite"""
+        fts_query = self.prepare_fts_query(query)
         
         params = [fts_query]
-        conditions = []
         
         # Filtros adicionales
         if category:
-            conditions.append("p.category = ?")
             params.append(category)
         
         if assignee:
-            conditions.append("p.assignee LIKE ?")
             params.append(f"%{assignee}%")
         
         if date_range:
-            conditions.append("p.publication_date BETWEEN ? AND ?")
             params.extend(date_range)
         
-        # Agregar condiciones
-        if conditions:
-            base_query += " AND " + " AND ".join(conditions)
-        
-        # Ordenar por relevancia FTS y limitar
-        base_query += " ORDER BY rank LIMIT ?"
         params.append(limit)
         
-        # Ejecutar búsqueda con conexión thread-safe
-        with self.get_connection() as conn:
-            cursor = conn.execute(base_query, params)
-            results = cursor.fetchall()
+        # SQL ya armado para esta combinación de filtros (mismo texto = sentencia cacheada)
+        base_query = self.search_sql[(bool(category), bool(assignee), bool(date_range))]
         
-        # Convertir a diccionarios y agregar score
+        # Ejecutar búsqueda con conexión thread-safe
         formatted_results = []
-        for row in results:
-            result = dict(row)
-            
-            # Parsear JSON fields de forma segura
-            try:
-                result['inventors'] = json.loads(result.get('inventors', '[]'))
-            except:
-                result['inventors'] = []
-                
-            try:
-                result['ipc_classes'] = json.loads(result.get('ipc_classes', '[]'))
-            except:
-                result['ipc_classes'] = []
-            
-            # Calcular score personalizado
-            result['score'] = self.calculate_custom_score(result, query)
-            
-            formatted_results.append(result)
-        
-        # Re-ordenar por score personalizado
-        formatted_results.sort(key=lambda x: x['score'], reverse=True)
+        with self.get_connection() as conn:
+            # Convertir las tuplas a diccionarios a medida que se leen (sin lista intermedia);
+            # el score ya viene de SQLite como última columna
+            for row in conn.execute(base_query, params):
+                formatted_results.append(self.row_to_result(row))
         
         return formatted_results
     
+    def row_to_result(self, row: tuple) -> Dict:
+        """Convertir una fila de RESULT_COLUMNS (más score opcional) a diccionario"""
+        (id_, title, abstract, description, claims, assignee, inventors,
+         application_date, publication_date, ipc_class, ipc_classes, category,
+         word_count, char_count, tech_terms, *score) = row
+        
+        result = {
+            'id': id_,
+            'title': title,
+            'abstract': abstract,
+            'description': description,
+            'claims': claims,
+            'assignee': assignee,
+            'inventors': unpack_list_field(inventors),
+            'application_date': application_date,
+            'publication_date': publication_date,
+            'ipc_class': ipc_class,
+            'ipc_classes': unpack_list_field(ipc_classes),
+            'category': category,
+            'word_count': word_count,
+            'char_count': char_count,
+            'tech_terms': tech_terms
+        }
+        if score:
+            result['score'] = score[0]
+        return result
+    
+    def query_terms(self, text: str) -> List[str]:
+        """Separar texto en términos sin signos (seguro para la sintaxis FTS5)"""
+        # translate resuelve el caso ASCII; la regex solo hace falta con otros caracteres
+        text = text.translate(ASCII_NON_WORD_TABLE)
+        if not text.isascii():
+            text = NON_WORD_RE.sub(' ', text)
+        return text.split()
+    
     def prepare_fts_query(self, query: str) -> str:
         """Preparar query para FTS5"""
-        query = re.sub(r'[^\w\s]', ' ', query)
-        terms = query.split()
-        
-        if len(terms) == 1:
-            return f'"{terms[0]}"*'
-        else:
-            return ' OR '.join(f'"{term}"*' for term in terms)
-    
-    def calculate_custom_score(self, patent: Dict, original_query: str) -> float:
-        """Calcular score personalizado similar a BM25"""
-        score = 0.0
-        query_terms = original_query.lower().split()
-        
-        # Pesos por campo
-        field_weights = {
-            'title': 3.0,
-            'abstract': 2.0,
-            'claims': 1.5,
-            'description': 1.0
-        }
+        terms = self.query_terms(query)
         
-        for field, weight in field_weights.items():
-            field_text = patent.get(field, '').lower()
-            if field_text:
-                for term in query_terms:
-                    tf = field_text.count(term)
-                    if tf > 0:
-                        score += tf * weight
+        # Sin términos: frase vacía válida que no coincide con nada
+        if not terms:
+            return '""'
         
-        # Boost por categoría tecnológica
-        if patent.get('category') in ['artificial_intelligence', 'telecommunications']:
-            score *= 1.2
-        
-        return score
+        return ' OR '.join(f'"{term}"*' for term in terms)
     
     def search_by_field(self, field: str, value: str, limit: int = 10) -> List[Dict]:
         """Búsqueda específica por campo (Thread-Safe)"""
@@ -310,81 +677,65 @@ class SQLitePatentSearch:
         if field not in valid_fields:
             raise ValueError(f"Invalid field. Must be one of: {valid_fields}")
         
-        if field == 'inventors':
-            query = f"SELECT * FROM patents WHERE inventors LIKE ? LIMIT ?"
-            params = [f'%{value}%', limit]
+        # Mismos caracteres permitidos que prepare_fts_query: sin sintaxis FTS5 en el valor
+        terms = self.query_terms(value)
+        
+        if field == 'category':
+            # Categorías son valores cerrados: igualdad exacta usa idx_category
+            query = f"SELECT {self.RESULT_COLUMNS} FROM patents p WHERE category = ? LIMIT ?"
+            params = [value, limit]
+        elif terms:
+            # Frase (con prefijo en el último término) limitada a la columna en el índice FTS5,
+            # en lugar de LIKE '%valor%' que recorre toda la tabla
+            query = f"""
+                SELECT {self.RESULT_COLUMNS}
+                FROM patents_fts
+                JOIN patents p ON p.rowid = patents_fts.rowid
+                WHERE patents_fts MATCH ?
+                LIMIT ?
+            """
+            params = [f'{field} : "{" ".join(terms)}"*', limit]
         else:
-            query = f"SELECT * FROM patents WHERE {field} LIKE ? LIMIT ?"
+            # Valor sin términos indexables (solo signos): comparación literal
+            query = f"SELECT {self.RESULT_COLUMNS} FROM patents p WHERE {field} LIKE ? LIMIT ?"
             params = [f'%{value}%', limit]
         
         with self.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            results = cursor.fetchall()
-        
-        return [dict(row) for row in results]
+            return [self.row_to_result(row) for row in conn.execute(query, params)]
     
     def get_aggregations(self) -> Dict[str, Any]:
         """Obtener agregaciones similares a Elasticsearch (Thread-Safe)"""
-        aggregations = {}
+        facets = {field: {} for field in self.FACET_SOURCES}
         
+        # Una sola lectura de las facetas precalculadas, ya ordenadas por conteo
         with self.get_connection() as conn:
-            # Top assignees
             cursor = conn.execute("""
-                SELECT assignee, COUNT(*) as count 
-                FROM patents 
-                WHERE assignee != ''
-                GROUP BY assignee 
-                ORDER BY count DESC 
-                LIMIT 10
+                SELECT field, value, count
+                FROM patent_facets
+                ORDER BY field, count DESC, value
             """)
-            aggregations['top_assignees'] = dict(cursor.fetchall())
-            
+            for field, value, count in cursor:
+                facets[field][value] = count
+        
+        return {
+            # Top assignees
+            'top_assignees': dict(islice(facets['assignee'].items(), 10)),
             # Categories
-            cursor = conn.execute("""
-                SELECT category, COUNT(*) as count 
-                FROM patents 
-                GROUP BY category 
-                ORDER BY count DESC
-            """)
-            aggregations['categories'] = dict(cursor.fetchall())
-            
+            'categories': facets['category'],
             # IPC classes
-            cursor = conn.execute("""
-                SELECT ipc_class, COUNT(*) as count 
-                FROM patents 
-                WHERE ipc_class != ''
-                GROUP BY ipc_class 
-                ORDER BY count DESC 
-                LIMIT 10
-            """)
-            aggregations['ipc_classes'] = dict(cursor.fetchall())
-            
+            'ipc_classes': dict(islice(facets['ipc_class'].items(), 10)),
             # Date histogram (by year)
-            cursor = conn.execute("""
-                SELECT substr(publication_date, 1, 4) as year, COUNT(*) as count
-                FROM patents 
-                WHERE length(publication_date) >= 4
-                GROUP BY year 
-                ORDER BY year DESC
-            """)
-            aggregations['by_year'] = dict(cursor.fetchall())
-            
-            # Total patents
-            cursor = conn.execute("SELECT COUNT(*) FROM patents")
-            aggregations['total_patents'] = cursor.fetchone()[0]
-        
-        return aggregations
+            'by_year': dict(sorted(facets['year'].items(), reverse=True)),
+            # Total patents: cada patente tiene exactamente una categoría
+            'total_patents': sum(facets['category'].values())
+        }
     
     def create_search_stats(self):
         """Crear estadísticas de la base de datos (Thread-Safe)"""
-        with self.get_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) FROM patents")
-            total_patents = cursor.fetchone()[0]
-        
         aggregations = self.get_aggregations()
         
         stats = {
-            "total_patents": total_patents,
+            "total_patents": aggregations['total_patents'],
             "aggregations": aggregations
         }
         
@@ -396,10 +747,25 @@ class SQLitePatentSearch:
         return stats
     
     def close(self):
-        """Cerrar conexión thread-local"""
-        if hasattr(self.local, 'conn') and self.local.conn:
-            self.local.conn.close()
-            self.local.conn = None
+        """Cerrar la conexión de escritura y las del pool de lectura"""
+        with self.write_lock:
+            if self.write_conn:
+                # Recomendado por SQLite al cerrar: actualizar estadísticas si quedaron viejas
+                self.write_conn.execute("PRAGMA optimize")
+                self.write_conn.close()
+                self.write_conn = None
+        
+        with self.read_pool_lock:
+            while True:
+                try:
+                    self.read_pool.get_nowait().close()
+                except queue.Empty:
+                    break
+            self.read_conns_opened = 0
+
+def prepare_row_worker(item):
+    """Preparar una fila en un proceso del pool a partir de (índice, patente)"""
+    return SQLitePatentSearch.prepare_row(*item)
 
 # Ejemplo de uso
 if __name__ == "__main__":
@@ -411,7 +777,8 @@ if __name__ == "__main__":
     
     if os.path.exists(patents_file):
         print("🔄 Loading patents data...")
-        search_engine.index_patents(patents_file)
+        # Carga fuera del servidor: las filas se preparan en un proceso por CPU
+        search_engine.index_patents(patents_file, prepare_workers=os.cpu_count() or 1)
         
         print("\n🔍 TESTING SEARCHES:")
         print("-" * 40)
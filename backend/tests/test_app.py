@@ -0,0 +1,48 @@
+# backend/tests/test_app.py
+import importlib
+
+import pytest
+
+class FakeElasticsearch:
+    """Cliente mínimo que devuelve una respuesta de búsqueda fija"""
+
+    def __init__(self, response):
+        self.response = response
+        self.bodies = []
+
+    def search(self, index, body, filter_path=None):
+        self.bodies.append(body)
+        return self.response
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # app crea la base SQLite en el directorio actual al importarse
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('app')
+
+def test_search_elasticsearch_null_inventors(app_module):
+    source = {
+        'id': 'US1',
+        'title': 'Crop harvesting system',
+        'abstract': 'A harvester that detects crop rows.',
+        'inventors': None,
+        'ipc_classes': None,
+        'category': 'agriculture'
+    }
+    response = {'hits': {'total': {'value': 1}, 'hits': [{'_source': source, '_score': 1.5}]}}
+
+    api = app_module.PatentSearchAPI()
+    api.search_engine = FakeElasticsearch(response)
+    api.engine_type = 'elasticsearch'
+
+    results = api.search_patents('harvester')
+
+    assert 'error' not in results
+    assert results['total'] == 1
+
+    with app_module.app.app_context():
+        payload = app_module.json_response(results).get_json()
+    hit = payload['results'][0]
+    assert hit['id'] == 'US1'
+    assert hit['inventors'] is None
+    assert hit['score'] == 1.5
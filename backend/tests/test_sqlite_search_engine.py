@@ -0,0 +1,57 @@
+# backend/tests/test_sqlite_search_engine.py
+import re
+
+import pytest
+
+import sqlite_search_engine
+from sqlite_search_engine import SQLitePatentSearch, pack_list_field, unpack_list_field
+
+@pytest.fixture
+def engine():
+    search_engine = SQLitePatentSearch(':memory:')
+    yield search_engine
+    search_engine.close()
+
+@pytest.fixture(params=['re', 're2'])
+def non_word_re(request, monkeypatch):
+    """NON_WORD_RE compilada con cada motor de regex"""
+    if request.param == 're2':
+        re2 = pytest.importorskip('re2')
+        compiled = re2.compile(sqlite_search_engine.RE2_NON_WORD_PATTERN)
+    else:
+        compiled = re.compile(sqlite_search_engine.NON_WORD_PATTERN)
+    monkeypatch.setattr(sqlite_search_engine, 'NON_WORD_RE', compiled)
+
+@pytest.mark.parametrize('query, terms', [
+    ('café-crème, señal (5G)', ['café', 'crème', 'señal', '5G']),
+    ('naïve_x résumé', ['naïve_x', 'résumé']),
+    ('e\u0301lan vital', ['e', 'lan', 'vital']),  # Marca combinante
+    ('straße ½ ٣ Ⅻ', ['straße', '½', '٣', 'Ⅻ']),
+    ('“quoted” — text…', ['quoted', 'text']),
+    ('日本語の特許', ['日本語の特許']),
+    ('x\u00a0y\u2003z', ['x', 'y', 'z'])
+])
+def test_query_terms_same_with_re_and_re2(engine, non_word_re, query, terms):
+    assert engine.query_terms(query) == terms
+
+def test_pack_list_field_none():
+    assert pack_list_field(None) == ''
+    assert unpack_list_field(pack_list_field(None)) == []
+    assert unpack_list_field('null') == []  # Formato JSON anterior
+
+def test_index_patent_with_null_lists(engine):
+    patent = {
+        'id': 'US1',
+        'title': 'Crop harvesting system',
+        'abstract': 'A harvester that detects crop rows.',
+        'inventors': None,
+        'ipc_classes': None,
+        'category': 'agriculture'
+    }
+
+    assert engine.index_patents([patent]) == 1
+
+    results = engine.search('harvester')
+    assert [r['id'] for r in results] == ['US1']
+    assert results[0]['inventors'] == []
+    assert results[0]['ipc_classes'] == []